@@ -8,21 +8,31 @@
 
 import os
 import re
-import requests
 from typing import List, Optional
 
+from tvkit.compress import COMPRESS_FORMATS
+from tvkit.encoding import decode_content
+from tvkit.http import get_session
+from tvkit.httpcache import get_cache, conditional_get, script_stamp
+from tvkit.matcher import get_matcher
+from tvkit.metrics import Metrics
+from tvkit.writer import write_text
+
 class WebContentFilter:
     def __init__(self, tmp_dir: str = "TMP"):
         self.tmp_dir = tmp_dir
         os.makedirs(tmp_dir, exist_ok=True)
+        self.cache = get_cache()
+        self.metrics = Metrics("hw")
         
     def fetch_url_content(self, url: str) -> Optional[str]:
         """获取单个URL的内容"""
         try:
-            response = requests.get(url, timeout=10)
+            response = conditional_get(get_session(), url, self.cache, metrics=self.metrics, timeout=10)
             response.raise_for_status()
-            response.encoding = response.apparent_encoding
-            return response.text
+            text, _ = decode_content(response.content, url, response.headers.get("Content-Type"),
+                                     cache=self.cache)
+            return text
         except Exception as e:
             print(f"获取URL {url} 失败: {e}")
             return None
@@ -35,13 +45,14 @@ class WebContentFilter:
         # 分割成#genren#段
         segments = re.split(r'(#genren#)', content)
         filtered_segments = []
+        matcher = get_matcher(exclude_words)
         
         i = 0
         while i < len(segments):
             if segments[i] == '#genren#' and i + 1 < len(segments):
                 segment_content = segments[i+1]
                 # 检查是否包含排除关键词
-                exclude_segment = any(word in segment_content for word in exclude_words)
+                exclude_segment = segment_content in matcher
                 if not exclude_segment:
                     filtered_segments.append('#genren#')
                     filtered_segments.append(segment_content)
@@ -59,9 +70,10 @@ class WebContentFilter:
             
         lines = content.split('\n')
         filtered_lines = []
+        matcher = get_matcher(exclude_words)
         
         for line in lines:
-            if not any(word in line for word in exclude_words):
+            if line not in matcher:
                 filtered_lines.append(line)
                 
         return '\n'.join(filtered_lines)
@@ -69,41 +81,58 @@ class WebContentFilter:
     def process_urls(self, urls: List[str], 
                      exclude_segment_words: List[str] = None,
                      exclude_line_words: List[str] = None,
-                     output_file: str = "s.txt") -> None:
+                     output_file: str = "s.txt") -> bool:
         """处理URL列表并保存结果"""
         exclude_segment_words = exclude_segment_words or []
         exclude_line_words = exclude_line_words or []
         
         all_content = []
+        contents = []
         
-        for url in urls:
-            print(f"正在处理: {url}")
-            content = self.fetch_url_content(url)
-            if content:
-                # 先过滤段
-                filtered_content = self.filter_segments(content, exclude_segment_words)
-                # 再过滤行
-                filtered_content = self.filter_lines(filtered_content, exclude_line_words)
-                all_content.append(filtered_content)
-                
-        # 合并所有内容
-        final_content = '\n'.join(all_content)
+        with self.metrics.stage("fetch"):
+            for url in urls:
+                print(f"正在处理: {url}")
+                contents.append(self.fetch_url_content(url))
+        self.cache.save()
+        
+        output_path = os.path.join(self.tmp_dir, output_file)
+        stamp = script_stamp(__file__)
+        if self.cache.output_unchanged(urls, output_path, stamp):
+            print(f"上游内容未变化，跳过处理: {output_path}")
+            return True
         
-        # 移除所有#genre#行
-        lines = final_content.split('\n')
-        filtered_lines = [line for line in lines if '#genre#' not in line]
+        with self.metrics.stage("filter"):
+            for content in contents:
+                if content:
+                    # 先过滤段
+                    filtered_content = self.filter_segments(content, exclude_segment_words)
+                    # 再过滤行
+                    filtered_content = self.filter_lines(filtered_content, exclude_line_words)
+                    all_content.append(filtered_content)
+                    
+            # 合并所有内容
+            final_content = '\n'.join(all_content)
+            
+            # 移除所有#genre#行
+            lines = final_content.split('\n')
+            filtered_lines = [line for line in lines if '#genre#' not in line]
+        self.metrics.count_lines("filter", sum(content.count('\n') + 1 for content in contents if content),
+                                 len(filtered_lines))
         
         # 添加指定第一行
         filtered_lines.insert(0, "hycg,#genre#")
         
         # 保存结果
-        output_path = os.path.join(self.tmp_dir, output_file)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(filtered_lines))
+        with self.metrics.stage("write"):
+            write_text(output_path, '\n'.join(filtered_lines), compress=COMPRESS_FORMATS)
+        self.cache.mark_output(output_path, stamp)
+        self.cache.save()
             
         print(f"处理完成，结果已保存到: {output_path}")
+        return True
 
-if __name__ == "__main__":
+
+def main():
     # 示例配置
     urls = [
         "https://raw.githubusercontent.com/bj123sd/hycg/refs/heads/main/tv.txt",
@@ -120,8 +149,15 @@ if __name__ == "__main__":
     filter = WebContentFilter()
     
     # 处理URL
-    filter.process_urls(
-        urls=urls,
-        exclude_segment_words=exclude_segment_words,
-        exclude_line_words=exclude_line_words
-    )
+    try:
+        return filter.process_urls(
+            urls=urls,
+            exclude_segment_words=exclude_segment_words,
+            exclude_line_words=exclude_line_words
+        )
+    finally:
+        filter.metrics.emit()
+
+
+if __name__ == "__main__":
+    main()
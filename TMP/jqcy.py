@@ -1,44 +1,79 @@
 import requests
+from collections import Counter
+
+from tvkit.compress import COMPRESS_FORMATS
+from tvkit.encoding import decode_content
+from tvkit.http import get_session
+from tvkit.httpcache import get_cache, conditional_get, script_stamp
+from tvkit.metrics import Metrics
+from tvkit.pipeline import drop_owned, collect_urls
+from tvkit.tokenizer import tokenize
+from tvkit.urlindex import get_url_index
+from tvkit.writer import AtomicWriter
 
 def fetch_and_save():
     url = "http://nas.jqcykj.com:88"
     output_file = "jqcy.txt"
+    cache = get_cache()
+    url_index = get_url_index()
+    metrics = Metrics("jqcy")
     
     try:
-        # 获取原始字节数据
-        response = requests.get(url, timeout=10)
+        # 获取原始字节数据（上游未变化时复用缓存）
+        with metrics.stage("fetch"):
+            response = conditional_get(get_session(), url, cache, metrics=metrics, timeout=10)
         response.raise_for_status()
+        cache.save()
         
-        # ---------- 智能编码检测 ----------
-        # 1. 优先使用 requests 基于 chardet 的 apparent_encoding
-        if response.apparent_encoding:
-            response.encoding = response.apparent_encoding
-        else:
-            # 2. 若检测失败，尝试中文常用的 GBK 编码（也可尝试 gb18030）
-            response.encoding = 'gbk'
-        # 如果仍不行，可手动改为 'gb18030' 或 'utf-8'
-        # ---------------------------------
-        
-        content = response.text  # 此时应正确解码
+        stamp = script_stamp(__file__) + url_index.upstream_stamp(output_file)
+        if cache.output_unchanged([url], output_file, stamp):
+            print(f"✅ 上游内容未变化，跳过处理 {output_file}")
+            return True
         
-        # 按行分割
-        lines = content.splitlines()
+        # 编码识别：BOM → HTTP charset → UTF-8 → 上次识别结果 → 前缀 chardet
+        with metrics.stage("decode"):
+            content, encoding = decode_content(response.content, url,
+                                               response.headers.get("Content-Type"), cache=cache)
+        print(f"编码: {encoding}")
         
-        # 过滤包含 '#genre#' 的行（不区分大小写）
-        filtered_lines = [line for line in lines if '#genre#' not in line.lower()]
+        with metrics.stage("filter"):
+            # 按行分割
+            lines = content.splitlines()
+            
+            # 过滤包含 '#genre#' 的行（不区分大小写）
+            filtered_lines = [line for line in lines if '#genre#' not in line.lower()]
+            
+            # 删除已归属优先级更高的输出文件的 URL（跨文件去重）
+            stats = Counter()
+            written_urls = set()
+            records = collect_urls(drop_owned(tokenize(filtered_lines), url_index, output_file, stats),
+                                   written_urls)
+            filtered_lines = [record.raw for record in records]
+        metrics.count_lines("filter", len(lines), len(filtered_lines))
+        metrics.record_stats(stats)
+        if stats['owned_elsewhere']:
+            print(f"已归属其他文件: {stats['owned_elsewhere']} 行")
         
         # 写入文件（UTF-8 编码以兼容大多数编辑器）
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("jqcy,#genre#\n")
+        with metrics.stage("write"), AtomicWriter(output_file, compress=COMPRESS_FORMATS) as out:
+            out.write("jqcy,#genre#\n")
             for line in filtered_lines:
-                f.write(line + '\n')
+                out.write(line + '\n')
+        url_index.replace(output_file, written_urls)
+        url_index.save()
+        cache.mark_output(output_file, stamp)
+        cache.save()
         
         print(f"✅ 成功保存到 {output_file}，共写入 {len(filtered_lines) + 1} 行。")
+        return True
         
     except requests.exceptions.RequestException as e:
         print(f"❌ 网络请求失败: {e}")
     except Exception as e:
         print(f"❌ 发生错误: {e}")
+    finally:
+        metrics.emit()
+    return False
 
 if __name__ == "__main__":
     fetch_and_save()
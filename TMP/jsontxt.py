@@ -6,11 +6,18 @@ JSON URL解析器 - 从配置的URL获取JSON，提取1080p质量的条目并保
 
 import json
 import os
+from contextlib import ExitStack
 from pathlib import Path
-from urllib.request import urlopen, Request
-from urllib.error import URLError, HTTPError
 import time
 
+import requests
+
+from tvkit.compress import COMPRESS_FORMATS
+from tvkit.http import get_session
+from tvkit.jsonstream import iter_json_array
+from tvkit.metrics import Metrics
+from tvkit.writer import AtomicWriter
+
 
 # ==================== URL配置 ====================
 # 在这里添加或修改JSON数据源的URL
@@ -26,41 +33,111 @@ URLS = [
 DEFAULT_OUTPUT = "TMP/jsontxt.txt"
 DEFAULT_QUALITY = "1080p"
 
+# 流式读取响应的块大小（字节）
+CHUNK_SIZE = 64 * 1024
+
 
-def fetch_json_from_url(url, timeout=30):
+def iter_json_from_url(url, timeout=30, metrics=None):
     """
-    从URL获取JSON数据
+    从URL流式获取JSON数组，逐条产出（顶层不是数组时整体作为一条）
+    按块读取并增量解析，不把整个响应读入内存；出错时打印原因并停止产出，已产出的条目保留
     
     Args:
         url: JSON数据的URL地址
         timeout: 请求超时时间（秒）
+        metrics: 传入 Metrics 时记录字节数与耗时（耗时包含下游逐条处理的时间）
     
-    Returns:
-        解析后的JSON数据（列表）
+    Yields:
+        JSON数组中的每个元素
     """
     print(f"  正在获取: {url[:70]}...")
     
-    request = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    start = time.perf_counter()
+    size = 0
+    
+    def chunks(response):
+        nonlocal size
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            yield chunk
     
     try:
-        with urlopen(request, timeout=timeout) as response:
-            data = json.loads(response.read().decode('utf-8'))
-            return data if isinstance(data, list) else [data]
-    except HTTPError as e:
-        print(f"    HTTP错误 {e.code}: {e.reason}")
-        return []
-    except URLError as e:
-        print(f"    URL错误: {e.reason}")
-        return []
+        # 共享会话：复用连接，限流/临时错误按随机退避自动重试
+        with get_session().get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=timeout,
+                               stream=True) as response:
+            response.raise_for_status()
+            yield from iter_json_array(chunks(response))
+    except requests.HTTPError as e:
+        print(f"    HTTP错误 {e.response.status_code}: {e.response.reason}")
+    except requests.RequestException as e:
+        print(f"    URL错误: {e}")
     except json.JSONDecodeError as e:
         print(f"    JSON解析错误: {e}")
-        return []
     except Exception as e:
         print(f"    未知错误: {e}")
-        return []
+    finally:
+        if metrics is not None and size:
+            metrics.record_fetch(url, size, time.perf_counter() - start)
 
 
-def parse_json_to_txt(urls, output_path, quality_filter='1080p'):
+def tier_path(output_path, quality):
+    """分档输出的文件路径：在文件名后追加 _<质量>，如 TMP/jsontxt_720p.txt"""
+    path = Path(output_path)
+    return str(path.with_name(f"{path.stem}_{quality}{path.suffix}"))
+
+
+def parse_json_to_tiers(urls, outputs, metrics=None):
+    """
+    从多个URL流式获取JSON，按质量分别写入多个txt文件（单遍）
+    每条数据到达时即按 quality 分发到对应文件，不在内存中保留数据
+    
+    Args:
+        urls: URL列表
+        outputs: 质量 → 输出txt文件路径
+        metrics: 记录各阶段指标的 Metrics（默认新建）
+    
+    Returns:
+        各质量的条目数（dict）和总条目数
+    """
+    metrics = metrics or Metrics("jsontxt")
+    counts = dict.fromkeys(outputs, 0)
+    total = 0
+    
+    with ExitStack() as stack:
+        # AtomicWriter 会创建缺失的输出目录；全部写完才替换目标文件
+        files = {quality: stack.enter_context(AtomicWriter(path, compress=COMPRESS_FORMATS))
+                 for quality, path in outputs.items()}
+        for f in files.values():
+            f.write("未整理,#genre#\n")
+        
+        # 从每个URL获取数据，边解析边过滤写入
+        for i, url in enumerate(urls, 1):
+            print(f"[{i}/{len(urls)}] 获取JSON数据...")
+            received = 0
+            with metrics.stage("fetch"):
+                for item in iter_json_from_url(url, metrics=metrics):
+                    received += 1
+                    if not isinstance(item, dict):
+                        continue
+                    quality = item.get('quality', '')
+                    f = files.get(quality)
+                    title = item.get('title', '')
+                    link = item.get('url', '')
+                    
+                    # 只保留指定质量的内容
+                    if f is not None and title and link:
+                        f.write(f"{title},{link}\n")
+                        counts[quality] += 1
+            if received:
+                print(f"    成功获取 {received} 条")
+            total += received
+    metrics.count_lines("write", total, sum(counts.values()))
+    
+    print(f"\n总共获取 {total} 条数据，" + "，".join(f"{q} {n} 条" for q, n in counts.items()))
+    return counts, total
+
+
+def parse_json_to_txt(urls, output_path, quality_filter='1080p', metrics=None):
     """
     从多个URL获取JSON并解析为txt格式
     
@@ -68,79 +145,65 @@ def parse_json_to_txt(urls, output_path, quality_filter='1080p'):
         urls: URL列表
         output_path: 输出txt文件路径
         quality_filter: 质量过滤条件（默认1080p）
+        metrics: 记录各阶段指标的 Metrics（默认新建）
     
     Returns:
         过滤后的条目数和总条目数
     """
-    all_items = []
-    
-    # 确保输出目录存在
-    output_dir = Path(output_path).parent
-    output_dir.mkdir(parents=True, exist_ok=True)
-    
-    # 从每个URL获取数据
-    for i, url in enumerate(urls, 1):
-        print(f"[{i}/{len(urls)}] 获取JSON数据...")
-        data = fetch_json_from_url(url)
-        if data:
-            all_items.extend(data)
-            print(f"    成功获取 {len(data)} 条")
-        time.sleep(0.3)  # 避免请求过快
-    
-    print(f"\n总共获取 {len(all_items)} 条数据，开始过滤 {quality_filter}...")
-    
-    # 过滤并写入txt文件
-    count = 0
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write("未整理,#genre#\n")
-        for item in all_items:
-            title = item.get('title', '')
-            url = item.get('url', '')
-            quality = item.get('quality', '')
-            
-            # 只保留指定质量的内容
-            if quality == quality_filter and title and url:
-                f.write(f"{title},{url}\n")
-                count += 1
-    
-    return count, len(all_items)
-
-
-def main():
-    """主函数"""
+    counts, total = parse_json_to_tiers(urls, {quality_filter: output_path}, metrics)
+    return counts[quality_filter], total
+
+
+def main(argv=None):
+    """主函数；argv 为 None 时读取命令行参数"""
     import argparse
     
-    parser = argparse.ArgumentParser(description='从配置URL获取JSON并解析为txt（仅保留1080p）')
+    parser = argparse.ArgumentParser(description='从配置URL获取JSON并解析为txt（默认仅保留1080p，可按质量分档输出）')
     parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT, help=f'输出txt文件路径（默认: {DEFAULT_OUTPUT}）')
     parser.add_argument('-q', '--quality', default=DEFAULT_QUALITY, help=f'质量过滤条件（默认: {DEFAULT_QUALITY}）')
+    parser.add_argument('-t', '--tiers', help='按质量分档输出，逗号分隔（如 1080p,720p,480p）；'
+                                              '各档写入 <输出文件名>_<质量>.txt，单遍完成，忽略 -q')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     urls = URLS
     
     if not urls:
         print("错误：URL列表为空，请在代码中的 URLS 列表添加数据源")
-        return
+        return False
+    
+    tiers = [q.strip() for q in args.tiers.split(',') if q.strip()] if args.tiers else None
+    outputs = {q: tier_path(args.output, q) for q in tiers} if tiers else {args.quality: args.output}
     
     print(f"\n" + "="*60)
     print(f"JSON URL解析器")
     print(f"="*60)
     print(f"URL数量: {len(urls)}")
-    print(f"输出文件: {args.output}")
-    print(f"质量过滤: {args.quality}")
+    if tiers:
+        print(f"质量分档: {', '.join(tiers)}")
+        for quality, path in outputs.items():
+            print(f"  - {quality}: {path}")
+    else:
+        print(f"输出文件: {args.output}")
+        print(f"质量过滤: {args.quality}")
     print(f"="*60 + "\n")
     
+    metrics = Metrics("jsontxt")
     try:
-        count, total = parse_json_to_txt(urls, args.output, args.quality)
+        counts, total = parse_json_to_tiers(urls, outputs, metrics)
         print(f"\n" + "="*60)
         print(f"解析完成！")
         print(f"  - 总获取数据: {total} 条")
-        print(f"  - {args.quality} 条目数: {count} 条")
-        print(f"  - 输出文件: {args.output}")
+        for quality, path in outputs.items():
+            print(f"  - {quality} 条目数: {counts[quality]} 条 -> {path}")
         print(f"="*60)
+        return True
     except Exception as e:
         print(f"\n错误：{e}")
         import traceback
         traceback.print_exc()
+        return False
+    finally:
+        metrics.emit()
 if __name__ == '__main__':
     main()
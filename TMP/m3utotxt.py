@@ -1,6 +1,13 @@
-import requests
 from urllib.parse import urlparse
 
+from tvkit.emitters import ChannelWriter, output_paths
+from tvkit.http import get_session
+from tvkit.httpcache import get_cache
+from tvkit.m3u import parse_m3u
+from tvkit.matcher import get_matcher
+from tvkit.metrics import Metrics
+from tvkit.pipeline import fetch_source
+
 def convert_m3u_to_txt(urls, exclude_chars=None, output_file="TMP/temp.txt"):
     """
     将指定URL列表中的M3U内容转换为TXT格式并保存到文件
@@ -10,77 +17,54 @@ def convert_m3u_to_txt(urls, exclude_chars=None, output_file="TMP/temp.txt"):
         exclude_chars (list): 需要排除的字符列表，包含这些字符的行会被过滤掉
         output_file (str): 输出文件路径，默认为"TMP/hw.txt"
     """
-    output = []
     group_set = set()
+    cache = get_cache()
+    metrics = Metrics("m3utotxt")
+    track = metrics.track
     
     # 默认排除字符为空列表
     if exclude_chars is None:
         exclude_chars = []
+    matcher = get_matcher(exclude_chars)
     
-    for url in urls:
-        try:
-            # 获取M3U文件内容
-            response = requests.get(url)
-            response.raise_for_status()  # 检查请求是否成功
-            content = response.text
-            lines = content.split('\n')
-            
-            for i in range(len(lines)):
-                line = lines[i].strip()
-                if line.startswith('#EXTINF'):
-                    # 提取分组信息
-                    import re
-                    group_match = re.search(r'group-title="([^"]+)"', line)
-                    name_start = line.rfind(',') + 1
-                    name = line[name_start:] if name_start < len(line) else ""
-                    
-                    group_name = group_match.group(1) if group_match else '未分类'
-                    
-                    # 检查是否需要排除
-                    should_exclude = False
-                    for char in exclude_chars:
-                        if char in name or char in group_name:
-                            should_exclude = True
-                            break
-                    
-                    if should_exclude:
-                        continue  # 跳过需要排除的行
-                    
-                    # 添加分组（去重）
-                    if group_name not in group_set:
-                        output.append(f"{group_name},#genre#")
-                        group_set.add(group_name)
-                    
-                    # 处理下一行的URL
-                    if i + 1 < len(lines):
-                        next_line = lines[i + 1].strip()
-                        if next_line and next_line.startswith('http'):
-                            # 检查URL是否需要排除
-                            url_should_exclude = False
-                            for char in exclude_chars:
-                                if char in next_line:
-                                    url_should_exclude = True
-                                    break
-                            
-                            if not url_should_exclude:
-                                output.append(f"{name},{next_line}")
-                            i += 1  # 跳过已处理的URL行
-                            
-        except Exception as e:
-            print(f"处理URL {url} 时出错: {e}")
-    
-    # 确保输出目录存在
-    import os
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    
-    # 写入文件
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(output))
+    # 边解析边写入（原子替换，内容未变化时不重写；输出目录不存在时自动创建）；
+    # TVKIT_OUTPUT_FORMATS 指定时同时写出保留 #EXTINF 属性的 .m3u 与 .json
+    with ChannelWriter(output_paths(output_file)) as out:
+        for url in urls:
+            try:
+                # 获取M3U文件内容（流式落盘，上游未变化时复用缓存）
+                with metrics.stage("fetch"):
+                    body = fetch_source(get_session(), url, cache, metrics=metrics, timeout=30)
+                
+                # 逐行解析为频道（#EXTINF 属性与其后的 URL 行）
+                with metrics.stage("parse"):
+                    for record in track("parse", parse_m3u(track("read", body.iter_lines()))):
+                        group_name = record.genre or '未分类'
+                        
+                        # 检查是否需要排除
+                        if record.name in matcher or group_name in matcher:
+                            continue  # 跳过需要排除的频道
+                        
+                        # 添加分组（去重）
+                        if group_name not in group_set:
+                            out.write(f"{group_name},#genre#")
+                            group_set.add(group_name)
+                        
+                        # 检查URL是否需要排除
+                        if record.url.startswith('http') and record.url not in matcher:
+                            out.write(record)
+                                
+            except Exception as e:
+                print(f"处理URL {url} 时出错: {e}")
+        
+        cache.save()
+    metrics.emit()
     
     print(f"转换完成，结果已保存到 {output_file}")
+    return True
 
-# 示例用法
-if __name__ == "__main__":
+
+def main():
     # 替换为你需要处理的M3U URL列表
     m3u_urls = [
         #"https://raw.githubusercontent.com/xJEYDAin/iptv-scraper/refs/heads/master/output/all_merged.m3u", 
@@ -95,4 +79,9 @@ if __name__ == "__main__":
     # 需要排除的字符列表
     exclude_chars = ["wns.live","cloudfront.net","stevosure123","visionplus.id","google","ads.deviceid"]
     
-    convert_m3u_to_txt(m3u_urls, exclude_chars)
+    return convert_m3u_to_txt(m3u_urls, exclude_chars)
+
+
+# 示例用法
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,41 @@
 import requests
 import os
 import sys
+from collections import Counter
+from itertools import islice
+
+from tvkit.fetch import fetch_all, MAX_FETCH_WORKERS
+from tvkit.http import get_session
+from tvkit.httpcache import get_cache, script_stamp
+from tvkit.liveness import StreamChecker, stream_check_from_env
+from tvkit.metrics import Metrics, run_processor
+from tvkit.pipeline import (fetch_source, chain_sources, close_sources, exclude_sections,
+                            drop_genre_lines, dedup_by_url, drop_owned, collect_urls,
+                            filter_alive, keyword_hits, write_lines)
+from tvkit.rank import best_n_from_env, rank_mirrors
+from tvkit.urlindex import get_url_index
 
 # 全局排除关键词定义
 EXCLUDE_KEYWORDS = ["成人", "激情", "虎牙", "体育", "熊猫", "提示","记录","解说","春晚","直播","更新","赛事","SPORTS","电视剧","优质个源","明星","主题片","戏曲","游戏","MTV","收音机","悍刀","家人","音乐"]
 
+# 依次尝试的源编码（UTF-8 优先，其次常见中文编码）
+SOURCE_ENCODINGS = ("utf-8", "gbk", "gb18030")
+
+# 流级别存活检测（TVKIT_STREAM_CHECK=1 开启）与每个频道保留的最快镜像数（TVKIT_BEST_N）
+STREAM_CHECK = stream_check_from_env()
+BEST_N = best_n_from_env()
+
 class TVSourceProcessor:
-    def __init__(self):
-        self.all_lines = []
+    def __init__(self, max_workers: int = MAX_FETCH_WORKERS):
+        self.bodies = []
+        self.max_workers = max_workers
+        self.cache = get_cache()
+        self.url_index = get_url_index()
+        self.stats = Counter()
+        self.metrics = Metrics("my1")
         
     def fetch_url_content(self, url: str):
-        """直接获取URL内容，强制转换为UTF-8"""
+        """流式获取URL内容，按 UTF-8 → GBK → GB18030 顺序确定编码"""
         try:
             print(f"获取: {url}")
             
@@ -18,121 +43,46 @@ class TVSourceProcessor:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
             }
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
-            
-            # 直接使用原始字节数据，强制转换为UTF-8
-            content_bytes = response.content
-            
-            # 尝试多种方式解码，优先UTF-8，如果失败尝试其他编码
-            decoded_content = None
-            
-            # 尝试UTF-8解码
-            try:
-                decoded_content = content_bytes.decode('utf-8')
-                print(f"  使用UTF-8解码成功")
-            except UnicodeDecodeError:
-                # 如果UTF-8失败，尝试GBK编码（常见的中文编码）
-                try:
-                    decoded_content = content_bytes.decode('gbk')
-                    print(f"  使用GBK解码成功")
-                except UnicodeDecodeError:
-                    # 如果GBK也失败，尝试GB18030（中文扩展编码）
-                    try:
-                        decoded_content = content_bytes.decode('gb18030')
-                        print(f"  使用GB18030解码成功")
-                    except UnicodeDecodeError:
-                        # 如果所有尝试都失败，使用UTF-8并忽略错误
-                        decoded_content = content_bytes.decode('utf-8', errors='ignore')
-                        print(f"  使用UTF-8(忽略错误)解码")
-            
-            # 分割行
-            lines = [line.strip() for line in decoded_content.splitlines() if line.strip()]
-            print(f"  成功: {len(lines)} 行")
-            return lines
+            body = fetch_source(get_session(), url, self.cache, encoding=SOURCE_ENCODINGS,
+                                metrics=self.metrics, headers=headers, timeout=30)
+            if body.from_cache:
+                print(f"  未变化(304)，使用缓存 <- {url}")
+            print(f"  使用{body.encoding.upper()}解码")
+            print(f"  成功: {body.size} 字节 <- {url}")
+            return body
             
         except Exception as e:
-            print(f"  失败: {e}")
-            return []
+            print(f"  失败: {e} <- {url}")
+            return None
 
     def fetch_multiple_urls(self, urls: list):
-        """获取多个URL内容"""
-        self.all_lines = []
-        for url in urls:
-            lines = self.fetch_url_content(url)
-            if lines:
-                self.all_lines.extend(lines)
-        print(f"总计: {len(self.all_lines)} 行")
-        return len(self.all_lines) > 0
+        """并发获取多个URL内容，按源顺序排列"""
+        self.bodies = fetch_all(self.fetch_url_content, urls, self.max_workers)
+        ok = [body for body in self.bodies if body is not None]
+        print(f"总计: {len(ok)} 个源, {sum(body.size for body in ok)} 字节")
+        return len(ok) > 0
 
-    def remove_excluded_sections(self):
+    def remove_excluded_sections(self, lines):
         """排除指定区域"""
-        if not self.all_lines:
-            return []
-        result = []
-        in_excluded_section = False
-        for line in self.all_lines:
-            if "#genre#" in line:
-                if any(keyword in line for keyword in EXCLUDE_KEYWORDS):
-                    in_excluded_section = True
-                else:
-                    in_excluded_section = False
-                result.append(line)
-            elif not in_excluded_section:
-                result.append(line)
-        print(f"排除后: {len(result)} 行")
-        return result
+        return exclude_sections(lines, EXCLUDE_KEYWORDS, self.stats)
 
-    def remove_genre_lines_and_deduplicate(self, lines: list):
-        """删除genre行并去重"""
-        import re
-        result = []
-        seen_urls = set()
-        for line in lines:
-            if "#genre#" in line:
-                continue
-            if not line.strip():
-                continue
-            # 提取URL去重
-            url_match = re.search(r'(https?://[^\s,]+)', line)
-            if url_match:
-                url = url_match.group(1)
-                if url not in seen_urls:
-                    seen_urls.add(url)
-                    result.append(line)
-            else:
-                result.append(line)
-        print(f"去重后: {len(result)} 行")
-        return result
+    def remove_genre_lines_and_deduplicate(self, lines):
+        """删除genre行并去重（含已归属其他输出文件的URL）"""
+        final = dedup_by_url(drop_genre_lines(lines), stats=self.stats)
+        return drop_owned(final, self.url_index, "my1.txt", self.stats)
 
-    def save_to_file(self, lines: list, filename: str, first_line: str):
-        """强制使用UTF-8编码保存到文件"""
+    def save_to_file(self, lines, filename: str, first_line: str):
+        """流式保存到文件（UTF-8），返回写入的行数，失败返回 -1"""
         try:
-            content = [first_line] + lines
-            
-            # 确保所有内容都是字符串
-            str_lines = []
-            for line in content:
-                if isinstance(line, bytes):
-                    # 如果是字节，尝试解码
-                    try:
-                        str_lines.append(line.decode('utf-8'))
-                    except:
-                        str_lines.append(str(line, errors='ignore'))
-                else:
-                    str_lines.append(str(line))
-            
-            # 使用UTF-8编码保存
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(str_lines))
-            
-            file_size = os.path.getsize(filename)
-            print(f"保存: {filename} ({len(str_lines)}行, {file_size}字节)")
-            print(f"编码: UTF-8")
-            return True
+            count = write_lines(filename, lines, first_line)
+            if count:
+                file_size = os.path.getsize(filename)
+                print(f"保存: {filename} ({count + 1}行, {file_size}字节)")
+                print(f"编码: UTF-8")
+            return count
         except Exception as e:
             print(f"保存失败: {e}")
-            return False
+            return -1
 
     def process(self):
         """主处理流程"""
@@ -144,28 +94,57 @@ class TVSourceProcessor:
         print(f"源URL: {len(urls)}个")
         
         # 1. 获取内容
-        if not self.fetch_multiple_urls(urls):
+        with self.metrics.stage("fetch"):
+            fetched = self.fetch_multiple_urls(urls)
+        self.cache.save()
+        if not fetched:
             print("无内容可处理")
             return False
         
-        # 2. 排除处理
-        filtered = self.remove_excluded_sections()
-        if not filtered:
-            print("排除后无内容")
-            return False
+        stamp = script_stamp(__file__) + self.url_index.upstream_stamp("my1.txt")
+        # 开启流检测时每次重新检测，存活结果不因上游返回 304 而过期
+        if not STREAM_CHECK and self.cache.output_unchanged(urls, "my1.txt", stamp):
+            close_sources(self.bodies)
+            print("上游内容未变化，跳过处理")
+            return True
         
-        # 3. 去重处理
-        final = self.remove_genre_lines_and_deduplicate(filtered)
-        if not final:
-            print("去重后无内容")
+        # 2. 排除处理 → 3. 去重处理 → 4. 保存文件（逐行流式处理）
+        track = self.metrics.track
+        lines = track("parse", chain_sources(self.bodies))
+        filtered = track("exclude", self.remove_excluded_sections(lines))
+        final = track("dedup", self.remove_genre_lines_and_deduplicate(filtered))
+        checker = StreamChecker() if STREAM_CHECK else None
+        if checker is not None:
+            final = track("stream_check", filter_alive(final, checker, self.stats))
+        if BEST_N > 0 and checker is None:
+            print("未开启流检测（TVKIT_STREAM_CHECK=1），没有可比较的延迟，跳过镜像排序")
+        elif BEST_N > 0:
+            final = track("rank", rank_mirrors(final, lambda r: checker.latency(r.url), BEST_N, self.stats))
+        written_urls = set()
+        with self.metrics.stage("process"):
+            count = self.save_to_file(collect_urls(final, written_urls), "my1.txt", "hacktool,#genre#")
+        print(f"排除: {self.stats['excluded_lines']} 行, 去重: {self.stats['duplicates']} 行, "
+              f"已归属其他文件: {self.stats['owned_elsewhere']} 行")
+        if checker is not None:
+            checker.close()
+            print(f"流检测: 存活 {self.stats[('stream', 'alive')]}, 重定向 {self.stats[('stream', 'redirect')]}, "
+                  f"失效 {self.stats[('stream', 'dead')]}")
+        if self.stats['ranked_out']:
+            print(f"镜像排序: 每个频道保留 {BEST_N} 个，移除 {self.stats['ranked_out']} 行")
+        if self.stats['excluded_sections']:
+            print(f"  排除区域关键词: {keyword_hits(self.stats, 'excluded')}")
+        if count < 0:
             return False
-        
-        # 4. 保存文件
-        if self.save_to_file(final, "my1.txt", "hacktool,#genre#"):
-            print("处理完成")
-            return True
-        else:
+        if count == 0:
+            print("处理后无内容")
             return False
+        
+        self.url_index.replace("my1.txt", written_urls)
+        self.url_index.save()
+        self.cache.mark_output("my1.txt", stamp)
+        self.cache.save()
+        print("处理完成")
+        return True
 
 def main():
     """主函数"""
@@ -176,8 +155,7 @@ def main():
         print("错误: requests库未安装，请运行: pip install requests")
         sys.exit(1)
     
-    processor = TVSourceProcessor()
-    success = processor.process()
+    success = run_processor(TVSourceProcessor())
     
     # 退出状态码
     if success and os.path.exists("my1.txt"):
@@ -185,10 +163,9 @@ def main():
         # 显示文件前几行
         try:
             with open("my1.txt", 'r', encoding='utf-8') as f:
-                lines = f.readlines()
                 print(f"文件前5行内容:")
-                for i in range(min(5, len(lines))):
-                    print(f"  {i+1}: {lines[i].strip()}")
+                for i, line in enumerate(islice(f, 5)):
+                    print(f"  {i+1}: {line.strip()}")
         except Exception as e:
             print(f"读取文件内容失败: {e}")
         
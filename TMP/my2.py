@@ -4,9 +4,18 @@
 TVBox M3U直播源获取工具（Cloudflare绕过版）
 优化版：按分组名过滤整个分组，最后统一放在mengyxx分组下
 """
-import re
+import io
 import time
 
+from tvkit.canonical import canonical_url
+from tvkit.clearance import ClearanceStore
+from tvkit.emitters import ChannelWriter, output_paths
+from tvkit.http import backoff_delay
+from tvkit.m3u import parse_m3u
+from tvkit.matcher import get_matcher
+from tvkit.metrics import Metrics
+from tvkit.tokenizer import parse_line
+
 try:
     import cloudscraper
 except ImportError:
@@ -37,8 +46,34 @@ def create_scraper():
     )
 
 
+_scraper = None
+_clearance = ClearanceStore()
+
+
+def get_scraper():
+    """
+    进程内共享的scraper（API_URLS 中的各地址共用）
+    首次调用时装回上次保存的 User-Agent 与未过期的通过凭据，凭据有效期内不再重新解挑战
+    """
+    global _scraper
+    if _scraper is None:
+        _scraper = create_scraper()
+        expires = _clearance.load(_scraper)
+        if expires is not None:
+            print(f"  复用已保存的Cloudflare凭据（有效至 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(expires))}）")
+    return _scraper
+
+
+def reset_scraper():
+    """凭据失效：丢弃保存的凭据，换新指纹重建scraper"""
+    global _scraper
+    _clearance.clear()
+    _scraper = create_scraper()
+    return _scraper
+
+
 def fetch_m3u(url):
-    scraper = create_scraper()
+    scraper = get_scraper()
     
     for attempt in range(MAX_RETRIES):
         try:
@@ -49,9 +84,12 @@ def fetch_m3u(url):
             if "Just a moment" in text or "cloudflare" in text.lower():
                 print(f"  ⚠ 仍被Cloudflare拦截，尝试更换指纹...")
                 if attempt < MAX_RETRIES - 1:
-                    time.sleep(5)
-                    scraper = create_scraper()
+                    time.sleep(backoff_delay(attempt, resp))
+                    scraper = reset_scraper()
                     continue
+            else:
+                # 保存（可能新解出的）通过凭据，供后续地址与下次运行复用
+                _clearance.save(scraper)
             
             if text.startswith("#EXTM3U") or "#EXTINF" in text[:500]:
                 print(f"  ✓ 成功获取 (大小: {len(text)} 字节)")
@@ -63,7 +101,7 @@ def fetch_m3u(url):
         except Exception as e:
             print(f"  ✗ 请求失败: {e}")
             if attempt < MAX_RETRIES - 1:
-                time.sleep(3)
+                time.sleep(backoff_delay(attempt))
                 continue
             return None
     
@@ -71,85 +109,79 @@ def fetch_m3u(url):
 
 
 def parse_m3u_with_groups(m3u_content):
-    """解析M3U，保留分组信息用于后续过滤"""
+    """解析M3U，保留分组信息用于后续过滤；没有 group-title 的频道沿用上一个分组"""
     if not m3u_content:
         return [], {}
     
-    lines = m3u_content.splitlines()
-    channels_by_group = {}  # {分组名: [频道列表]}
+    channels_by_group = {}  # {分组名: [频道列表]}，分组按首次出现的顺序排列
     current_group = "其他"
-    current_name = None
-    all_groups = []
     
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        if line.startswith("#EXTM3U") or line.startswith("#EXT-X-") or line.startswith("//"):
-            continue
-        
-        if line.startswith("#EXTINF"):
-            match = re.search(r',([^,]+)$', line)
-            if match:
-                current_name = match.group(1).strip()
-            group_match = re.search(r'group-title="([^"]*)"', line)
-            if group_match:
-                current_group = group_match.group(1).strip()
-                if current_group not in all_groups:
-                    all_groups.append(current_group)
-            continue
-        
-        if line and not line.startswith("#") and current_name:
-            if current_group not in channels_by_group:
-                channels_by_group[current_group] = []
-            channels_by_group[current_group].append(f"{current_name},{line}")
-            current_name = None
+    for record in parse_m3u(io.StringIO(m3u_content, newline=None)):
+        if "group-title" in record.attrs:
+            current_group = record.attrs["group-title"].strip()
+        if record.name:
+            channels_by_group.setdefault(current_group, []).append(record)
     
-    return all_groups, channels_by_group
+    return list(channels_by_group), channels_by_group
 
 
 def filter_groups(channels_by_group, exclude_keywords):
     """按分组名过滤整个分组"""
     filtered = {}
     skipped_groups = []
+    matcher = get_matcher(exclude_keywords, ignore_case=True)
     
     for group_name, channels in channels_by_group.items():
         # 检查分组名是否包含排除关键词
-        if any(kw.lower() in group_name.lower() for kw in exclude_keywords):
-            skipped_groups.append((group_name, len(channels)))
+        keyword = matcher.search(group_name)
+        if keyword is not None:
+            skipped_groups.append((group_name, len(channels), keyword))
             continue
         filtered[group_name] = channels
     
     return filtered, skipped_groups
 
 
+def dedup_key(line):
+    """去重键：频道名 + 规范化后的 URL（默认端口、参数顺序等写法差异视为同一地址）"""
+    record = parse_line(line)
+    return (record.name, canonical_url(record.url)) if record.url else line
+
+
 def main():
     print("=" * 50)
     print("TVBox M3U → TXT 转换工具 (按分组过滤版)")
     print("=" * 50)
     
     all_channels = []
+    metrics = Metrics("my2")
     
     for url in API_URLS:
         print(f"\n正在处理: {url}")
-        m3u = fetch_m3u(url)
+        start = time.perf_counter()
+        with metrics.stage("fetch"):
+            m3u = fetch_m3u(url)
         
         if not m3u:
             print("  ✗ 获取失败，跳过")
             continue
+        metrics.record_fetch(url, len(m3u.encode('utf-8')), time.perf_counter() - start)
         
         print("  ↳ 解析分组信息...")
-        all_groups, channels_by_group = parse_m3u_with_groups(m3u)
+        with metrics.stage("parse"):
+            all_groups, channels_by_group = parse_m3u_with_groups(m3u)
         print(f"  ↳ 发现 {len(all_groups)} 个分组，共 {sum(len(v) for v in channels_by_group.values())} 个频道")
         
         # 按分组名过滤
         print("  ↳ 按分组名过滤...")
-        filtered_channels, skipped = filter_groups(channels_by_group, EXCLUDE_KEYWORDS)
+        with metrics.stage("filter"):
+            filtered_channels, skipped = filter_groups(channels_by_group, EXCLUDE_KEYWORDS)
+        metrics.count_lines("filter", sum(len(v) for v in channels_by_group.values()),
+                            sum(len(v) for v in filtered_channels.values()))
         
         # 统计过滤的频道
-        for group_name, count in skipped:
-            print(f"    ✗ 跳过分组 [{group_name}] - {count} 个频道")
+        for group_name, count, keyword in skipped:
+            print(f"    ✗ 跳过分组 [{group_name}] - {count} 个频道 (关键词: {keyword})")
         
         # 收集所有保留的频道
         for group_name, channels in filtered_channels.items():
@@ -159,33 +191,44 @@ def main():
     
     if not all_channels:
         print("\n❌ 未获取到任何有效内容，退出")
-        return
-    
-    # 去重
-    unique_channels = list(dict.fromkeys(all_channels))
+        metrics.emit()
+        return False
+    
+    # 去重（频道名相同且 URL 规范化后相同视为重复）
+    with metrics.stage("dedup"):
+        unique = {}
+        for record in all_channels:
+            unique.setdefault(dedup_key(record.raw), record)
+        unique_channels = list(unique.values())
     dedup_count = len(all_channels) - len(unique_channels)
+    metrics.count_lines("dedup", len(all_channels), len(unique_channels))
     
     if dedup_count > 0:
         print(f"\n  已去除 {dedup_count} 个重复频道")
     
-    # 添加固定分组在第一行
-    final_content = FIXED_GROUP + "\n" + "\n".join(unique_channels)
-    
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        f.write(final_content)
+    # 添加固定分组在第一行；TVKIT_OUTPUT_FORMATS 指定时同时写出保留 #EXTINF 属性的 .m3u 与 .json
+    with metrics.stage("write"), ChannelWriter(output_paths(OUTPUT_FILE)) as out:
+        out.write(FIXED_GROUP)
+        for record in unique_channels:
+            out.write(record)
+    metrics.emit()
     
     print("\n" + "=" * 50)
     print(f"✅ 完成！已保存到 {OUTPUT_FILE}")
     print(f"  最终频道数: {len(unique_channels)}")
-    print(f"  文件大小: {len(final_content.encode('utf-8'))} 字节")
+    print(f"  文件大小: {out.files['txt'].size} 字节")
+    for fmt, path in out.outputs.items():
+        if fmt != "txt":
+            print(f"  {fmt}: {path} ({out.files[fmt].size} 字节)")
     print(f"  固定分组: {FIXED_GROUP}")
     print("=" * 50)
     
     # 显示前几行预览
     print("\n📄 内容预览（前10行）：")
-    preview_lines = final_content.splitlines()[:10]
+    preview_lines = [FIXED_GROUP] + [record.raw for record in unique_channels[:9]]
     for i, line in enumerate(preview_lines, 1):
         print(f"  {i:2d}. {line[:80]}")
+    return True
 
 
 if __name__ == "__main__":
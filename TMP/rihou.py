@@ -1,7 +1,18 @@
-import re
 import os
 import sys
-import requests
+from collections import Counter
+
+from tvkit.fetch import fetch_all, MAX_FETCH_WORKERS
+from tvkit.http import get_session
+from tvkit.httpcache import get_cache, script_stamp
+from tvkit.incremental import SourceResultCache
+from tvkit.liveness import StreamChecker, stream_check_from_env
+from tvkit.metrics import Metrics, run_processor
+from tvkit.pipeline import (fetch_source, close_sources, exclude_sections,
+                            drop_genre_lines, filter_keywords, dedup_by_url, drop_owned,
+                            collect_urls, filter_alive, keyword_hits, write_lines)
+from tvkit.rank import best_n_from_env, rank_mirrors
+from tvkit.urlindex import get_url_index
 
 # 全局排除关键词定义（用于分类排除）
 EXCLUDE_KEYWORDS = [
@@ -23,18 +34,36 @@ CONTENT_FILTER_KEYWORDS = [
 ]
 
 
+# 请求头
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+                  'AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/120.0.0.0 Safari/537.36'
+}
+
+# 流级别存活检测（TVKIT_STREAM_CHECK=1 开启）与每个频道保留的最快镜像数（TVKIT_BEST_N）
+STREAM_CHECK = stream_check_from_env()
+BEST_N = best_n_from_env()
+
+
 class TVSourceProcessor:
-    def __init__(self):
+    def __init__(self, max_workers: int = MAX_FETCH_WORKERS):
+        self.max_workers = max_workers
         # 按 (url, genre_name) 对存储，格式: [(url, genre), ...]
         self.url_genre_pairs = []
-        # 按 genre 分组存储原始行: {genre: [lines]}
-        self.genre_lines = {}
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                          'AppleWebKit/537.36 (KHTML, like Gecko) '
-                          'Chrome/120.0.0.0 Safari/537.36'
-        })
+        # 按 genre 分组存储已落盘的源: {genre: [SourceBody]}
+        self.genre_sources = {}
+        self.cache = get_cache()
+        self.url_index = get_url_index()
+        # 本次写出的 URL（url_key），写完后登记到全局索引
+        self.written_urls = set()
+        self.checker = StreamChecker() if STREAM_CHECK else None
+        if BEST_N > 0 and self.checker is None:
+            print("未开启流检测（TVKIT_STREAM_CHECK=1），没有可比较的延迟，跳过镜像排序")
+        self.session = get_session()
+        # 按源缓存的本地阶段结果（源内容与脚本均未变化时直接复用）
+        self.source_results = SourceResultCache("rihou", script_stamp(__file__))
+        self.metrics = Metrics("rihou")
 
     def parse_urls_config(self, urls_config):
         """
@@ -62,122 +91,115 @@ class TVSourceProcessor:
         return pairs
 
     def fetch_url_content(self, url: str):
-        """使用 requests 获取URL内容"""
+        """使用 requests 流式获取URL内容"""
         try:
             print(f"获取: {url}")
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            response.encoding = response.apparent_encoding
-            content = response.text
-            lines = [line.strip() for line in content.splitlines() if line.strip()]
-            print(f"  成功: {len(lines)} 行")
-            return lines
+            body = fetch_source(self.session, url, self.cache, metrics=self.metrics, headers=HEADERS, timeout=30)
+            if body.from_cache:
+                print(f"  未变化(304)，使用缓存 <- {url}")
+            print(f"  成功: {body.size} 字节 ({body.encoding}) <- {url}")
+            return body
         except Exception as e:
-            print(f"  失败: {e}")
-            return []
+            print(f"  失败: {e} <- {url}")
+            return None
 
     def fetch_multiple_urls(self, urls_config):
-        """获取多个URL内容，按段名分组存储"""
+        """并发获取多个URL内容，按段名分组存储（段顺序与配置一致）"""
         pairs = self.parse_urls_config(urls_config)
-        total_lines = 0
-        for url, genre in pairs:
-            lines = self.fetch_url_content(url)
-            if lines:
-                if genre not in self.genre_lines:
-                    self.genre_lines[genre] = []
-                self.genre_lines[genre].extend(lines)
-                total_lines += len(lines)
-        print(f"总计: {total_lines} 行, {len(self.genre_lines)} 个段")
-        return total_lines > 0
-
-    def remove_excluded_sections(self, lines: list):
-        """排除指定区域（针对单个段的行列表）"""
-        if not lines:
-            return []
-        result = []
-        in_excluded_section = False
-        for line in lines:
-            if "#genre#" in line:
-                if any(keyword in line for keyword in EXCLUDE_KEYWORDS):
-                    in_excluded_section = True
-                else:
-                    in_excluded_section = False
-                result.append(line)
-            elif not in_excluded_section:
-                result.append(line)
-        return result
-
-    def remove_genre_lines_and_deduplicate(self, lines: list, seen_urls: set):
+        total_bytes = 0
+        results = fetch_all(self.fetch_url_content, [url for url, _ in pairs], self.max_workers)
+        for (url, genre), body in zip(pairs, results):
+            if body is not None:
+                self.genre_sources.setdefault(genre, []).append(body)
+                total_bytes += body.size
+        print(f"总计: {total_bytes} 字节, {len(self.genre_sources)} 个段")
+        return total_bytes > 0
+
+    def remove_excluded_sections(self, lines, stats: Counter = None):
+        """排除指定区域（针对单个段的行流）"""
+        return exclude_sections(lines, EXCLUDE_KEYWORDS, stats)
+
+    def filter_source_lines(self, lines, stats: Counter):
+        """只依赖单个源内容的阶段：排除区域 → 删除genre行 → 过滤内容关键词"""
+        lines = self.remove_excluded_sections(lines, stats)
+        return filter_keywords(drop_genre_lines(lines), CONTENT_FILTER_KEYWORDS, stats)
+
+    def deduplicate(self, lines, seen_urls: set, stats: Counter):
         """
-        删除genre行，按URL全局去重，并过滤内容关键词
-        seen_urls 跨段共享，确保同一URL不会出现在多个段中
+        按URL全局去重
+        seen_urls 跨段共享，确保同一URL不会出现在多个段中；
+        已归属优先级更高的输出文件的URL同样删除
         """
-        result = []
-        filtered_count = 0
-        dup_count = 0
-        for line in lines:
-            if "#genre#" in line:
-                continue
-            if not line.strip():
-                continue
-            line_lower = line.lower()
-            if any(keyword.lower() in line_lower for keyword in CONTENT_FILTER_KEYWORDS):
-                filtered_count += 1
-                continue
-            url_match = re.search(r'(https?://[^\s,]+)', line)
-            if url_match:
-                url = url_match.group(1)
-                if url not in seen_urls:
-                    seen_urls.add(url)
-                    result.append(line)
-                else:
-                    dup_count += 1
-            else:
-                result.append(line)
-        print(f"  内容过滤: {filtered_count} 行, 去重: {dup_count} 行, 保留: {len(result)} 行")
-        return result
+        lines = dedup_by_url(lines, seen_urls, stats)
+        return drop_owned(lines, self.url_index, "rihou.txt", stats)
+
+    def iter_source_lines(self, bodies, stats: Counter):
+        """逐个源产出本地阶段处理后的行，未变化的源读取缓存结果"""
+        for body in bodies:
+            yield from self.source_results.process(body, self.filter_source_lines, stats)
 
     def process_genre_lines(self):
-        """对所有段分别处理：排除区域 → 过滤去重"""
+        """对所有段分别处理：排除区域 → 过滤 → 去重，按段产出 (段名, 行流, 统计)"""
         seen_urls = set()  # 全局去重集合，跨段共享
-        processed = {}
-        for genre, lines in self.genre_lines.items():
-            print(f"\n处理段: {genre} ({len(lines)} 行)")
-            filtered = self.remove_excluded_sections(lines)
-            if not filtered:
-                print(f"  排除后无内容")
-                continue
-            final = self.remove_genre_lines_and_deduplicate(filtered, seen_urls)
-            if final:
-                processed[genre] = final
-        return processed
-
-    def save_to_file(self, genre_lines: dict, filename: str):
+        for genre, bodies in self.genre_sources.items():
+            stats = Counter()
+            track = self.metrics.track
+            final = track("sources", self.iter_source_lines(bodies, stats))
+            final = track("dedup", self.deduplicate(final, seen_urls, stats))
+            if self.checker is not None:
+                final = track("stream_check", filter_alive(final, self.checker, stats))
+            if BEST_N > 0 and self.checker is not None:
+                final = track("rank", rank_mirrors(final, self.latency_of, BEST_N, stats))
+            yield genre, collect_urls(final, self.written_urls), stats
+
+    def latency_of(self, record):
+        """镜像排序使用的延迟：流检测的首字节耗时"""
+        return self.checker.latency(record.url) if self.checker is not None else None
+
+    def iter_output_lines(self, sections, counts: dict):
         """
-        按段写入文件，每个段以 "段名,#genre#" 开头
-        段之间空一行分隔
+        按段输出，每个段以 "段名,#genre#" 开头，段之间空一行分隔
+        处理后为空的段不输出；counts 记录各段写出的频道数
         """
+        first_section = True
+        for genre, records, stats in sections:
+            count = 0
+            for record in records:
+                if count == 0:
+                    if not first_section:
+                        yield ""  # 段间空行
+                    yield f"{genre},#genre#"
+                    first_section = False
+                yield record
+                count += 1
+            print(f"  [{genre}] 内容过滤: {stats['filtered']} 行, 去重: {stats['duplicates']} 行, "
+                  f"已归属其他文件: {stats['owned_elsewhere']} 行, 保留: {count} 行")
+            if stats['filtered']:
+                print(f"    命中关键词: {keyword_hits(stats, 'filtered')}")
+            if stats['dead']:
+                print(f"    流检测失效: {stats['dead']} 行")
+            if stats['ranked_out']:
+                print(f"    镜像排序移除: {stats['ranked_out']} 行")
+            if count:
+                counts[genre] = count
+            self.metrics.record_stats(stats)
+
+    def save_to_file(self, sections, filename: str):
+        """流式按段写入文件，返回 {段名: 频道数}，失败返回 None"""
         try:
-            content = []
-            for genre, lines in genre_lines.items():
-                content.append(f"{genre},#genre#")
-                content.extend(lines)
-                content.append("")  # 段间空行
-            # 去掉末尾多余的空行
-            while content and content[-1] == "":
-                content.pop()
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(content))
+            counts = {}
+            total_lines = write_lines(filename, self.iter_output_lines(sections, counts))
+            if not total_lines:
+                return counts
             file_size = os.path.getsize(filename)
-            total_lines = len(content)
             print(f"\n保存: {filename} ({total_lines}行, {file_size}字节)")
             # 打印各段统计
-            for genre, lines in genre_lines.items():
-                print(f"  [{genre}] {len(lines)} 个频道")
-            return True
+            for genre, count in counts.items():
+                print(f"  [{genre}] {count} 个频道")
+            return counts
         except Exception as e:
             print(f"保存失败: {e}")
-            return False
+            return None
 
     def process(self):
         """主处理流程"""
@@ -194,24 +216,47 @@ class TVSourceProcessor:
             "https://raw.githubusercontent.com/swhtv/1/refs/heads/main/swtvlive","swtv",
         ]
         print(f"源URL: {len(urls)}个配置项")
-        if not self.fetch_multiple_urls(urls):
+        with self.metrics.stage("fetch"):
+            fetched = self.fetch_multiple_urls(urls)
+        self.cache.save()
+        if not fetched:
             print("无内容可处理")
             return False
 
-        processed = self.process_genre_lines()
-        if not processed:
+        stamp = script_stamp(__file__) + self.url_index.upstream_stamp("rihou.txt")
+        # 开启流检测时每次重新检测，存活结果不因上游返回 304 而过期
+        if self.checker is None and self.cache.output_unchanged([url for url, _ in self.url_genre_pairs],
+                                                                "rihou.txt", stamp):
+            for bodies in self.genre_sources.values():
+                close_sources(bodies)
+            print("上游内容未变化，跳过处理")
+            return True
+
+        with self.metrics.stage("process"):
+            counts = self.save_to_file(self.process_genre_lines(), "rihou.txt")
+        if self.checker is not None:
+            self.checker.close()
+        results = self.source_results
+        print(f"按源增量处理: {results.misses} 个源重新处理, {results.hits} 个源复用缓存结果")
+        self.metrics.count("cache_hits", results.hits, kind="source_result")
+        self.metrics.count("cache_misses", results.misses, kind="source_result")
+        if counts is None:
+            return False
+        if not counts:
             print("处理后无内容")
             return False
 
-        if self.save_to_file(processed, "rihou.txt"):
-            print("处理完成")
-            return True
-        return False
+        self.source_results.finish()
+        self.url_index.replace("rihou.txt", self.written_urls)
+        self.url_index.save()
+        self.cache.mark_output("rihou.txt", stamp)
+        self.cache.save()
+        print("处理完成")
+        return True
 
 
 def main():
-    processor = TVSourceProcessor()
-    success = processor.process()
+    success = run_processor(TVSourceProcessor())
     if success and os.path.exists("rihou.txt"):
         print(f"文件位置: {os.path.abspath('rihou.txt')}")
         sys.exit(0)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统一任务入口：在同一进程中依次生成所有播放列表
+
+任务清单见 TMP/jobs.json，每项指定模块、入口（entry 函数，或 processor 类，
+由 tvkit.metrics.run_processor 运行并输出指标）与输出文件。
+所有任务共享一个 HTTP 连接池（tvkit.http）、一份 DNS 缓存（tvkit.dns）
+和已编译的关键词匹配器（tvkit.matcher），解释器启动与依赖导入只发生一次。
+
+任务之间按依赖关系调度：
+    needs    上游任务名列表，上游结束（无论成败）后才启动本任务
+    publish  输出文件在仓库中的发布地址；任务成功后把输出内容按该地址登记到
+             tvkit.artifacts，下游任务请求该地址时直接使用内存中的内容
+没有依赖关系的任务并行运行（--parallel 控制并行数）。
+上游未被选中或运行失败时，下游照常从网络获取该地址。
+
+用法：
+    python TMP/run_jobs.py            # 运行全部任务
+    python TMP/run_jobs.py rihou zubo # 只运行指定任务
+    python TMP/run_jobs.py --list     # 列出任务
+    python TMP/run_jobs.py --parallel 1  # 按依赖顺序逐个运行
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from tvkit import artifacts
+from tvkit.dns import install_dns_cache
+from tvkit.metrics import Metrics, run_processor
+
+TMP_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TMP_DIR)
+JOBS_FILE = os.path.join(TMP_DIR, "jobs.json")
+
+# 默认同时运行的任务数
+MAX_PARALLEL_JOBS = 4
+
+# 各任务的墙钟/CPU 时间（设置 TVKIT_METRICS 时与各任务自身的指标一并输出）
+metrics = Metrics("run_jobs")
+
+
+def load_jobs(path: str = JOBS_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_dependencies(jobs):
+    """检查依赖是否指向已知任务且无环，返回错误信息，正常时返回 None"""
+    names = {job["name"] for job in jobs}
+    for job in jobs:
+        unknown = set(job.get("needs", [])) - names
+        if unknown:
+            return f"任务 {job['name']} 依赖未知任务: {', '.join(sorted(unknown))}"
+
+    needs = {job["name"]: set(job.get("needs", [])) for job in jobs}
+    done = set()
+    while needs:
+        ready = [name for name, deps in needs.items() if deps <= done]
+        if not ready:
+            return f"任务依赖存在环: {', '.join(sorted(needs))}"
+        for name in ready:
+            done.add(name)
+            del needs[name]
+    return None
+
+
+def publish_output(job: dict):
+    """把成功任务的输出内容按发布地址登记，供下游任务直接读取"""
+    url = job.get("publish")
+    if not url:
+        return
+    try:
+        with open(job["output"], 'rb') as f:
+            data = f.read()
+    except OSError:
+        return
+    artifacts.publish(url, data)
+    print(f"已登记 {job['name']} 的输出: {job['output']} -> {url} ({len(data)} 字节)")
+
+
+def run_job(job: dict):
+    """运行单个任务，返回 (是否成功, 耗时)"""
+    start = time.time()
+    try:
+        module = importlib.import_module(job["module"])
+        with metrics.stage(job["name"]):
+            if "processor" in job:
+                result = run_processor(getattr(module, job["processor"])())
+            else:
+                result = getattr(module, job.get("entry", "main"))(*job.get("args", []))
+        ok = result is not False
+    except SystemExit as e:
+        ok = e.code in (None, 0)
+    except Exception:
+        traceback.print_exc()
+        ok = False
+    if ok:
+        publish_output(job)
+    return ok, time.time() - start
+
+
+def run_graph(jobs, max_parallel: int = MAX_PARALLEL_JOBS):
+    """
+    按依赖关系运行任务：依赖均已结束的任务立即提交，最多 max_parallel 个同时运行
+    未被选中的上游视为已结束；返回 {任务名: (是否成功, 耗时)}
+    """
+    selected = {job["name"] for job in jobs}
+    pending = list(jobs)
+    finished = set()
+    results = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+        while pending or running:
+            for job in list(pending):
+                if len(running) >= max_parallel:
+                    break
+                if (set(job.get("needs", [])) & selected) <= finished:
+                    pending.remove(job)
+                    print(f"\n>>> 启动任务: {job['name']} -> {job['output']}")
+                    running[executor.submit(run_job, job)] = job
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                ok, elapsed = future.result()
+                results[job["name"]] = (ok, elapsed)
+                finished.add(job["name"])
+                print(f"<<< 任务结束: {job['name']} {'成功' if ok else '失败'} ({elapsed:.1f}s)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在同一进程中运行 jobs.json 中的播放列表任务')
+    parser.add_argument('names', nargs='*', help='只运行指定名称的任务（默认全部）')
+    parser.add_argument('--list', action='store_true', help='列出任务后退出')
+    parser.add_argument('--parallel', type=int, default=MAX_PARALLEL_JOBS,
+                        help=f'同时运行的任务数（默认 {MAX_PARALLEL_JOBS}）')
+    args = parser.parse_args()
+    if args.parallel < 1:
+        parser.error(f"--parallel 至少为 1（收到 {args.parallel}）")
+
+    jobs = load_jobs()
+    error = check_dependencies(jobs)
+    if error:
+        print(error)
+        sys.exit(2)
+    if args.list:
+        for job in jobs:
+            needs = f"  (needs: {', '.join(job['needs'])})" if job.get("needs") else ""
+            print(f"{job['name']:<10} {job['module']}.{job.get('processor') or job.get('entry', 'main')} -> {job['output']}{needs}")
+        return
+    if args.names:
+        unknown = set(args.names) - {job["name"] for job in jobs}
+        if unknown:
+            print(f"未知任务: {', '.join(sorted(unknown))}")
+            sys.exit(2)
+        jobs = [job for job in jobs if job["name"] in args.names]
+
+    # 各脚本以仓库根目录为工作目录读写文件
+    os.chdir(ROOT_DIR)
+    install_dns_cache()
+
+    start = time.time()
+    results = run_graph(jobs, args.parallel)
+    for name, (ok, _) in results.items():
+        metrics.count("job_total", task=name, result="success" if ok else "fail")
+    metrics.emit()
+
+    print("\n" + "=" * 60)
+    for job in jobs:
+        ok, elapsed = results[job["name"]]
+        print(f"  {'✓' if ok else '✗'} {job['name']:<10} {elapsed:7.1f}s  {job['output']}")
+    print(f"  总耗时 {time.time() - start:.1f}s")
+    print("=" * 60)
+    sys.exit(0 if all(ok for ok, _ in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""
+直播源处理公共组件
+
+TMP 下各脚本共用的获取、过滤、去重与输出工具。
+脚本以 ``python TMP/xxx.py`` 方式运行时 TMP 目录位于 sys.path 中，
+可直接 ``import tvkit``。
+"""
+import os
+
+# 缓存根目录（HTTP 缓存、端点健康记录等），可通过环境变量覆盖；
+# GitHub Actions 中配合 actions/cache 在多次运行间保留
+CACHE_DIR = os.environ.get("TVKIT_CACHE_DIR", ".cache")
@@ -0,0 +1,28 @@
+"""
+进程内的任务产物
+
+run_jobs.py 在上游任务完成后，把它的输出文件内容按其发布地址登记在这里；
+同一进程中的下游任务通过 fetch_source 请求该地址时直接读取内存中的内容，
+不再经由 GitHub 绕一圈取回自己刚生成的文件。单独运行脚本时这里为空，照常走网络。
+"""
+import threading
+
+_artifacts = {}
+_lock = threading.Lock()
+
+
+def publish(url: str, data: bytes):
+    """登记某个地址对应的最新内容"""
+    with _lock:
+        _artifacts[url] = data
+
+
+def lookup(url: str):
+    """取得某个地址在本进程中登记的内容，没有时返回 None"""
+    with _lock:
+        return _artifacts.get(url)
+
+
+def clear():
+    with _lock:
+        _artifacts.clear()
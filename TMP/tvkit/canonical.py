@@ -0,0 +1,74 @@
+"""
+URL 规范化
+
+同一个流地址在不同源中写法各异，按原始字符串去重会把它们当成不同地址。
+去重前先归一：
+- 协议、主机名转小写，去掉默认端口（如 http 的 80、https 的 443）
+- 取出 video:// 等包装协议内嵌的地址
+- 空路径补 "/"；片段（#...）原样保留：不少源用 "#/?channelId=" 区分频道，
+  或用 "#" 连接备用地址
+- 查询参数按参数名稳定排序，删除 utm_* 等跟踪参数；参数值原样保留
+
+规范化只用于计算去重键，输出文件中仍保留原始行。同一 URL 在多个阶段、
+多个文件中反复出现，结果经 lru_cache 缓存。
+"""
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+
+from .channel import DEFAULT_PORTS, url_id
+
+# 不影响内容的跟踪参数
+TRACKING_PARAMS = frozenset({"fbclid", "gclid", "msclkid", "yclid", "spm"})
+TRACKING_PREFIXES = ("utm_",)
+
+# 包装协议：video://https://... 之类，取出内层地址
+WRAPPER_PATTERN = re.compile(r'^[A-Za-z][A-Za-z0-9+.-]*://(?=(?:https?|rtsp|rtmp)://)', re.IGNORECASE)
+
+# 规范化缓存的条目数
+CACHE_SIZE = 1 << 16
+
+
+def _is_tracking(param: str):
+    name = param.split("=", 1)[0].lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_url(url: str):
+    """返回规范化后的 URL；无法解析时原样返回"""
+    while True:
+        m = WRAPPER_PATTERN.match(url)
+        if m is None:
+            break
+        url = url[m.end():]
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+
+    userinfo, at, hostport = parts.netloc.rpartition("@")
+    if hostport.startswith("["):
+        end = hostport.find("]") + 1
+        host, port = hostport[:end], hostport[end + 1:]
+    else:
+        host, _, port = hostport.partition(":")
+    host = host.lower()
+    if port.isdigit() and DEFAULT_PORTS.get(scheme) == int(port):
+        port = ""
+    netloc = f"{userinfo}{at}{host}" + (f":{port}" if port else "")
+
+    query = parts.query
+    if query:
+        params = [p for p in query.split("&") if p and not _is_tracking(p)]
+        params.sort(key=lambda p: p.split("=", 1)[0])
+        query = "&".join(params)
+
+    return urlunsplit((scheme, netloc, parts.path or "/", query, parts.fragment))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def url_key(url: str):
+    """规范化 URL 的 64 位整数标识，去重与跨文件索引使用"""
+    return url_id(canonical_url(url))
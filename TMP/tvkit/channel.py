@@ -0,0 +1,122 @@
+"""
+频道记录
+
+Channel 使用 __slots__，不为每个实例分配 __dict__；协议、主机、区域名经 sys.intern 驻留，
+上万个频道共享同一份字符串。ChannelTable 为 主机:端口 端点分配整数 id，
+去重使用 URL 的 64 位哈希值，连通性测试等阶段只处理整数。
+"""
+import hashlib
+import os
+import re
+import sys
+
+IPV4_PATTERN = re.compile(r'\d{1,3}(?:\.\d{1,3}){3}')
+
+# 连通性测试是否包含域名主机与未写端口的地址（设置环境变量 TVKIT_PROBE_HOSTNAMES=1 开启）；
+# 默认只测试显式写出端口的 IPv4 地址，其余地址不测试、原样保留
+PROBE_HOSTNAMES = os.environ.get("TVKIT_PROBE_HOSTNAMES") == "1"
+
+# 各协议的默认 TCP 端口（URL 规范化与连通性测试共用）；udp/rtp 没有 TCP 默认端口
+DEFAULT_PORTS = {"http": 80, "https": 443, "rtsp": 554, "rtmp": 1935, "mms": 1755}
+
+
+def _intern(value):
+    return sys.intern(value) if value else value
+
+
+class Channel:
+    __slots__ = ("raw", "name", "url", "scheme", "host", "port", "path", "genre", "is_genre", "attrs")
+
+    def __init__(self, raw: str, name: str, url: str = None, scheme: str = None, host: str = None,
+                 port: int = None, path: str = "", genre: str = "", is_genre: bool = False,
+                 attrs: dict = None):
+        self.raw = raw
+        self.name = name
+        self.url = url
+        self.scheme = _intern(scheme)
+        self.host = _intern(host)
+        self.port = port
+        self.path = path
+        self.genre = _intern(genre)
+        self.is_genre = is_genre
+        # M3U 来源的 #EXTINF 属性（tvg-id、tvg-name、tvg-logo、group-title 等），txt 来源为 None
+        self.attrs = attrs
+
+    @property
+    def endpoint(self):
+        """
+        URL 自身的 (主机, 端口)，用于连通性测试；不参与测试的地址返回 None。
+        默认只有显式端口的 IPv4 主机参与测试；PROBE_HOSTNAMES 开启时主机也可以是域名
+        （测试时经 tvkit.dns 解析）或 IPv6，未写端口时取协议的默认端口。
+        /udp/239.x.x.x:port 形式的转发地址测试的是转发服务器本身，而不是路径中的组播地址
+        """
+        if not self.host:
+            return None
+        if not PROBE_HOSTNAMES:
+            if self.port is not None and IPV4_PATTERN.fullmatch(self.host):
+                return self.host, self.port
+            return None
+        port = self.port if self.port is not None else DEFAULT_PORTS.get(self.scheme)
+        if port is None:
+            return None
+        host = self.host
+        if host[0] == "[":
+            host = host[1:-1]
+        elif not IPV4_PATTERN.fullmatch(host):
+            host = host.lower()
+        return host, port
+
+    def __repr__(self):
+        return f"Channel({self.raw!r}, genre={self.genre!r})"
+
+
+def url_id(url: str):
+    """URL 的 64 位整数标识，去重集合只保存整数而不保存 URL 字符串"""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class ChannelTable:
+    """频道表：保存频道并为 主机:端口 端点分配连续整数 id"""
+
+    def __init__(self, channels=()):
+        self.channels = []
+        # 每个频道对应的端点 id，-1 表示没有端点
+        self.channel_endpoints = []
+        self.endpoints = []
+        self.endpoint_ids = {}
+        for channel in channels:
+            self.add(channel)
+
+    def add(self, channel: Channel):
+        """添加频道，返回频道 id"""
+        endpoint = channel.endpoint
+        eid = -1
+        if endpoint is not None:
+            eid = self.endpoint_ids.get(endpoint)
+            if eid is None:
+                eid = len(self.endpoints)
+                self.endpoint_ids[endpoint] = eid
+                self.endpoints.append(endpoint)
+        self.channels.append(channel)
+        self.channel_endpoints.append(eid)
+        return len(self.channels) - 1
+
+    def filter_endpoints(self, alive):
+        """
+        按端点状态过滤频道；alive 为以端点 id 为下标的真值序列
+        没有端点的频道保留，返回 (保留的频道列表, 移除数)
+        """
+        kept = []
+        dropped = 0
+        for channel, eid in zip(self.channels, self.channel_endpoints):
+            if eid < 0 or alive[eid]:
+                kept.append(channel)
+            else:
+                dropped += 1
+        return kept, dropped
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __iter__(self):
+        return iter(self.channels)
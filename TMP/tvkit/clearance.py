@@ -0,0 +1,65 @@
+"""
+Cloudflare 通过凭据的持久化
+
+cloudscraper 解出挑战后得到 cf_clearance 等 Cookie，它们与请求使用的 User-Agent 绑定。
+ClearanceStore 把会话的 User-Agent 与带过期时间的 Cookie 保存到缓存目录，
+下次运行时装回新建的 scraper：Cookie 未过期时直接带着它请求，不再重新解挑战；
+已过期的 Cookie 在加载与保存时丢弃，没有过期时间的会话 Cookie 不保存。
+"""
+import json
+import os
+import time
+
+from . import CACHE_DIR
+from .writer import write_text
+
+# Cloudflare 通过凭据的 Cookie 名
+CLEARANCE_COOKIE = "cf_clearance"
+
+
+class ClearanceStore:
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(CACHE_DIR, "clearance.json")
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, session, now: float = None):
+        """
+        把保存的 User-Agent 与未过期的 Cookie 装入 session
+        返回 cf_clearance 的过期时间戳（没有可用的通过凭据时返回 None）
+        """
+        now = time.time() if now is None else now
+        state = self._read()
+        cookies = [c for c in state.get("cookies", []) if c.get("expires") and c["expires"] > now]
+        if not cookies:
+            return None
+        if state.get("user_agent"):
+            session.headers["User-Agent"] = state["user_agent"]
+        for c in cookies:
+            session.cookies.set(c["name"], c["value"], domain=c["domain"], path=c["path"],
+                                expires=c["expires"], secure=c["secure"])
+        expires = [c["expires"] for c in cookies if c["name"] == CLEARANCE_COOKIE]
+        return min(expires) if expires else None
+
+    def save(self, session, now: float = None):
+        """保存 session 当前的 User-Agent 与带过期时间且未过期的 Cookie（原子写入）"""
+        now = time.time() if now is None else now
+        cookies = [
+            {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path,
+             "expires": c.expires, "secure": bool(c.secure)}
+            for c in session.cookies if c.expires and c.expires > now
+        ]
+        state = {"user_agent": session.headers.get("User-Agent"), "cookies": cookies}
+        write_text(self.path, json.dumps(state, ensure_ascii=False, indent=1))
+
+    def clear(self):
+        """凭据已失效：删除保存的状态"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,54 @@
+"""
+播放列表预压缩副本的格式与路径
+
+发布的播放列表可同时生成预压缩副本（my.txt.gz、my.txt.zst），供客户端与镜像直接取用。
+压缩参数固定、gzip 头不含文件名与时间戳，相同内容总是得到相同字节，不会在仓库中产生无意义的变更。
+环境变量 TVKIT_COMPRESS 指定格式（逗号分隔：gz、zst，默认 gz，设为空关闭）；
+zst 需要安装 zstandard，未安装时跳过。
+"""
+import gzip
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 压缩级别
+GZIP_LEVEL = 9
+ZSTD_LEVEL = 19
+
+# 压缩副本的格式 → 扩展名
+COMPRESS_EXTENSIONS = {"gz": ".gz", "zst": ".zst"}
+
+
+def _compress_formats():
+    formats = []
+    for fmt in os.environ.get("TVKIT_COMPRESS", "gz").split(","):
+        fmt = fmt.strip().lower()
+        if not fmt:
+            continue
+        if fmt not in COMPRESS_EXTENSIONS:
+            print(f"忽略未知的压缩格式: {fmt}（可选: {', '.join(COMPRESS_EXTENSIONS)}）")
+        elif fmt == "zst" and zstandard is None:
+            print("未安装 zstandard，跳过 .zst 副本: pip install zstandard")
+        else:
+            formats.append(fmt)
+    return tuple(formats)
+
+
+# 播放列表输出默认生成的压缩副本格式
+COMPRESS_FORMATS = _compress_formats()
+
+
+def compressed_paths(path: str, formats=None):
+    """输出文件的各压缩副本路径（formats 默认取 COMPRESS_FORMATS）"""
+    formats = COMPRESS_FORMATS if formats is None else formats
+    return [path + COMPRESS_EXTENSIONS[fmt] for fmt in formats]
+
+
+def open_compressor(fmt: str, fileobj):
+    """返回把写入内容按 fmt 压缩后写到 fileobj 的流；关闭流不会关闭 fileobj"""
+    if fmt == "gz":
+        return gzip.GzipFile(filename="", mode='wb', compresslevel=GZIP_LEVEL, fileobj=fileobj, mtime=0)
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(fileobj, closefd=False)
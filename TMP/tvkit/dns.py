@@ -0,0 +1,49 @@
+"""
+进程内 DNS 缓存
+
+替换 socket.getaddrinfo，相同参数的解析结果在有效期内直接复用。
+多个任务在同一进程中运行、反复访问同一批主机时避免重复解析。
+resolve() 供连通性测试把域名端点解析为 IP（按主机缓存，与端口无关）。
+"""
+import socket
+import threading
+import time
+
+# 解析结果有效期（秒）
+DNS_TTL = 300
+
+_original_getaddrinfo = socket.getaddrinfo
+_cache = {}
+_lock = threading.Lock()
+
+
+def _cached_getaddrinfo(*args, **kwargs):
+    key = (args, tuple(sorted(kwargs.items())))
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+    # 解析失败不缓存，异常直接抛出
+    result = _original_getaddrinfo(*args, **kwargs)
+    with _lock:
+        _cache[key] = (now + DNS_TTL, result)
+    return result
+
+
+def resolve(host: str):
+    """
+    把主机名解析为 (地址族, IP)，优先 IPv4；解析失败抛出 OSError
+    未启用缓存时同样经由 _cached_getaddrinfo，同一主机的多个端口只解析一次
+    """
+    infos = _cached_getaddrinfo(host, None, 0, socket.SOCK_STREAM)
+    for family, _, _, _, sockaddr in infos:
+        if family == socket.AF_INET:
+            return family, sockaddr[0]
+    family, _, _, _, sockaddr = infos[0]
+    return family, sockaddr[0]
+
+
+def install_dns_cache():
+    """启用 DNS 缓存（重复调用无副作用）"""
+    socket.getaddrinfo = _cached_getaddrinfo
@@ -0,0 +1,189 @@
+"""
+多格式输出
+
+同一组频道（Channel 或 “名称,URL” 行，可含 genre 行）单遍写出多种格式：
+- txt：原有的行格式，行之间以换行分隔（末尾不追加换行），genre 行为 “区域,#genre#”
+- m3u：扩展 M3U，保留来源的 #EXTINF 属性（tvg-id、tvg-name、tvg-logo 等），group-title 取所在区域
+- json：对象数组，每个频道为 {"name", "url", "group", "attrs"}
+每种格式是一个 Emitter 子类，按格式名登记在 EMITTERS 中；各自经 AtomicWriter 写入，
+内容未变化时不替换，并按 TVKIT_COMPRESS 生成压缩副本。m3u/json 的 URL 取 txt 行中逗号之后的部分，三种格式指向同一地址。
+
+环境变量 TVKIT_OUTPUT_FORMATS（逗号分隔，默认 txt）指定要生成的格式，
+其他格式的文件与 txt 同名、扩展名不同（my3.txt → my3.m3u、my3.json）。
+"""
+import json
+import os
+from contextlib import ExitStack
+
+from .compress import COMPRESS_FORMATS
+from .tokenizer import parse_line
+from .writer import AtomicWriter
+
+OUTPUT_FORMATS = tuple(f.strip().lower() for f in os.environ.get("TVKIT_OUTPUT_FORMATS", "txt").split(",")
+                       if f.strip())
+
+
+def channel_link(record):
+    """频道的播放地址：txt 行中第一个逗号之后的部分；没有逗号时取解析出的 URL"""
+    name, sep, link = record.raw.partition(",")
+    return link.strip() if sep else (record.url or "")
+
+
+class Emitter:
+    """一种输出格式；genre 行与频道按顺序依次传入"""
+
+    extension = ""
+
+    def __init__(self, out: AtomicWriter):
+        self.out = out
+        self.count = 0  # 写出的频道数（只输出 txt 时原样写入的字符串行不计）
+
+    def begin(self):
+        pass
+
+    def genre(self, record):
+        pass
+
+    def channel(self, record, group: str):
+        pass
+
+    def end(self):
+        pass
+
+
+class TxtEmitter(Emitter):
+    extension = ".txt"
+
+    def __init__(self, out: AtomicWriter):
+        super().__init__(out)
+        self._first = True
+
+    def line(self, raw: str):
+        if self._first:
+            self._first = False
+        else:
+            self.out.write("\n")
+        self.out.write(raw)
+
+    def genre(self, record):
+        self.line(record.raw)
+
+    def channel(self, record, group: str):
+        self.line(record.raw)
+        self.count += 1
+
+
+class M3uEmitter(Emitter):
+    extension = ".m3u"
+
+    def begin(self):
+        self.out.write("#EXTM3U\n")
+
+    def channel(self, record, group: str):
+        link = channel_link(record)
+        if not link:
+            return
+        attrs = dict(record.attrs) if record.attrs else {}
+        if group:
+            attrs["group-title"] = group
+        # 属性值中的双引号会截断属性，替换为单引号
+        fields = "".join(f' {key}="{value.replace(chr(34), chr(39))}"' for key, value in attrs.items())
+        self.out.write(f"#EXTINF:-1{fields},{record.name}\n{link}\n")
+        self.count += 1
+
+
+class JsonEmitter(Emitter):
+    extension = ".json"
+
+    def begin(self):
+        self.out.write("[")
+
+    def channel(self, record, group: str):
+        link = channel_link(record)
+        if not link:
+            return
+        item = {"name": record.name, "url": link, "group": group, "attrs": record.attrs or {}}
+        self.out.write(("\n" if self.count == 0 else ",\n") + json.dumps(item, ensure_ascii=False))
+        self.count += 1
+
+    def end(self):
+        self.out.write("\n]\n" if self.count else "]\n")
+
+
+EMITTERS = {
+    "txt": TxtEmitter,
+    "m3u": M3uEmitter,
+    "json": JsonEmitter,
+}
+
+
+def output_paths(path: str, formats=None):
+    """
+    各格式的输出路径：{格式: 路径}，txt 总是包含且使用 path 本身
+    formats 默认取 TVKIT_OUTPUT_FORMATS；未知格式抛出 ValueError
+    """
+    formats = OUTPUT_FORMATS if formats is None else formats
+    stem = os.path.splitext(path)[0]
+    outputs = {"txt": path}
+    for fmt in formats:
+        if fmt not in EMITTERS:
+            raise ValueError(f"未知的输出格式: {fmt}（可选: {', '.join(EMITTERS)}）")
+        if fmt != "txt":
+            outputs[fmt] = stem + EMITTERS[fmt].extension
+    return outputs
+
+
+class ChannelWriter:
+    """
+    用法：
+        with ChannelWriter(output_paths("my3.txt")) as out:
+            out.write("mengyxx,#genre#")
+            for record in records:
+                out.write(record)
+        out.files["txt"].changed  # 各格式的 AtomicWriter
+    write() 接受 Channel 或字符串行；只输出 txt 时字符串行原样写入，不做解析。
+    异常退出时所有格式的文件都保持不变
+    """
+
+    def __init__(self, outputs: dict):
+        self.outputs = outputs
+        self.files = {}
+        self.emitters = {}
+        self.group = ""
+        self._stack = None
+        self._text_only = list(outputs) == ["txt"]
+
+    def __enter__(self):
+        with ExitStack() as stack:
+            for fmt, path in self.outputs.items():
+                out = stack.enter_context(AtomicWriter(path, compress=COMPRESS_FORMATS))
+                self.files[fmt] = out
+                self.emitters[fmt] = EMITTERS[fmt](out)
+            self._stack = stack.pop_all()
+        for emitter in self.emitters.values():
+            emitter.begin()
+        return self
+
+    def write(self, record):
+        if isinstance(record, str):
+            if self._text_only:
+                self.emitters["txt"].line(record)
+                return
+            record = parse_line(record)
+        if record.is_genre:
+            self.group = record.name
+            for emitter in self.emitters.values():
+                emitter.genre(record)
+        else:
+            group = self.group or record.genre
+            for emitter in self.emitters.values():
+                emitter.channel(record, group)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            return self._stack.__exit__(exc_type, exc, tb)
+        # 收尾写入出错时同样丢弃全部临时文件
+        with self._stack:
+            for emitter in self.emitters.values():
+                emitter.end()
+        return False
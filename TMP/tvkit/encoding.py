@@ -0,0 +1,118 @@
+"""
+源正文编码识别
+
+response.apparent_encoding 对整个正文运行 chardet，几百 KB 的播放列表上很慢；
+逐个编码整体试解码同样要把正文解码多遍。这里只看有界的前缀，按代价从低到高判断：
+
+1. BOM
+2. HTTP Content-Type 中的 charset（ISO-8859-1 常是服务器默认值，不采信）
+3. 调用方给出的候选编码（给出时到此为止）
+4. UTF-8
+5. 该 URL 上次识别出的编码（保存在 ValidatorCache 中）
+6. 对前 DETECT_BYTES 字节运行 chardet
+
+2～5 用增量解码器校验前缀，前缀截断在多字节字符中间时不会误判。
+UTF-8 放在上次结果之前：UTF-8 中文往往也能按 GB18030 解码成乱码，
+而 GBK 正文几乎不可能通过 UTF-8 校验，上次结果只为非 UTF-8 的源省去 chardet。
+正文本身由调用方按识别结果增量解码（见 SourceBody.iter_lines）。
+"""
+import codecs
+
+import requests
+
+# 识别编码时读取的前缀长度
+SNIFF_BYTES = 64 * 1024
+
+# 交给 chardet 的样本长度（chardet 耗时与样本长度成正比）
+DETECT_BYTES = 16 * 1024
+
+# 按长度从长到短排列，UTF-32 LE 的 BOM 以 UTF-16 LE 的 BOM 开头
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# 服务器常见的默认 charset，不代表正文真实编码
+WEAK_CHARSETS = frozenset({'iso8859-1', 'cp1252'})
+
+# chardet 结果归一：GB2312/GBK 统一按其超集 GB18030 解码，ASCII 按 UTF-8 解码
+DETECTED_ALIASES = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'ascii': 'utf-8'}
+
+
+def _codec_name(name):
+    """规范化编码名，无法识别时返回 None"""
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+
+def decodes(prefix: bytes, encoding: str, final: bool = False):
+    """前缀能否按 encoding 解码；final 为 False 时忽略末尾不完整的多字节字符"""
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(prefix, final=final)
+        return True
+    except (UnicodeDecodeError, LookupError):
+        return False
+
+
+def charset_from_content_type(content_type):
+    """Content-Type 中的 charset 参数，没有或无法识别时返回 None"""
+    if not content_type:
+        return None
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            return _codec_name(value.strip().strip('"\''))
+    return None
+
+
+def detect_encoding(prefix: bytes, content_type: str = None, candidates=None, hint: str = None,
+                    final: bool = False):
+    """
+    根据正文前缀确定编码
+    candidates 为字符串时直接使用；为元组/列表时依次尝试，都不能解码时取第一个
+    final 表示 prefix 已是完整正文
+    """
+    if isinstance(candidates, str):
+        return candidates
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding
+
+    charset = charset_from_content_type(content_type)
+    if charset and charset not in WEAK_CHARSETS and decodes(prefix, charset, final):
+        return charset
+
+    if candidates:
+        for encoding in candidates:
+            if decodes(prefix, encoding, final):
+                return encoding
+        return candidates[0]
+
+    for encoding in ('utf-8', hint):
+        if encoding and decodes(prefix, encoding, final):
+            return encoding
+    detected = requests.compat.chardet.detect(prefix[:DETECT_BYTES]).get("encoding") if prefix else None
+    detected = _codec_name(detected) if detected else None
+    return DETECTED_ALIASES.get(detected, detected) or 'utf-8'
+
+
+def sniff(url: str, prefix: bytes, content_type: str = None, candidates=None, cache=None,
+          final: bool = False):
+    """detect_encoding，并以 ValidatorCache 记录/复用该 URL 上次识别出的编码"""
+    hint = cache.encoding_hint(url) if cache is not None else None
+    encoding = detect_encoding(prefix, content_type, candidates, hint, final)
+    if cache is not None:
+        cache.remember_encoding(url, encoding)
+    return encoding
+
+
+def decode_content(data: bytes, url: str = None, content_type: str = None, candidates=None, cache=None):
+    """解码完整正文（无法解码的字节以替换字符代替），返回 (文本, 编码)"""
+    encoding = sniff(url, data[:SNIFF_BYTES], content_type, candidates, cache,
+                     final=len(data) <= SNIFF_BYTES)
+    return data.decode(encoding, errors='replace'), encoding
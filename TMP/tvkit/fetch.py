@@ -0,0 +1,21 @@
+"""并发获取多个源，结果按源顺序返回"""
+from concurrent.futures import ThreadPoolExecutor
+
+# 默认并发上限（每次运行）
+MAX_FETCH_WORKERS = 8
+
+
+def fetch_all(fetch_one, items, max_workers: int = MAX_FETCH_WORKERS):
+    """
+    并发执行 fetch_one(item)，返回与 items 顺序一致的结果列表
+    运行总耗时取决于最慢的源，而不是所有源耗时之和
+    """
+    items = list(items)
+    if not items:
+        return []
+    workers = max(1, min(max_workers, len(items)))
+    if workers == 1:
+        return [fetch_one(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # map 按提交顺序产出结果，保证输出顺序稳定
+        return list(executor.map(fetch_one, items))
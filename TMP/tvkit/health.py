@@ -0,0 +1,85 @@
+"""
+端点健康记录
+
+用 SQLite 持久化每个 主机:端口 最近一次的测试结果、耗时与连续失败次数。
+结果在有效期（TTL）内直接复用，只有过期的端点才重新测试；
+连续失败的端点有效期按指数退避延长，避免每次运行都为它们等待超时。
+"""
+import os
+import random
+import sqlite3
+import time
+
+from . import CACHE_DIR
+
+# 成功结果有效期（秒），大于定时任务间隔，稳定端点可跨多次运行复用
+SUCCESS_TTL = 12 * 3600
+
+# 失败结果的初始有效期与上限（秒），每多一次连续失败翻倍
+FAILURE_TTL = 2 * 3600
+MAX_FAILURE_TTL = 3 * 24 * 3600
+
+# 超过该时间未再出现的端点会被清理（秒）
+PRUNE_AFTER = 30 * 24 * 3600
+
+
+class HealthStore:
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(CACHE_DIR, "health.sqlite3")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS endpoints ("
+            " key TEXT PRIMARY KEY,"
+            " ok INTEGER NOT NULL,"
+            " latency REAL,"
+            " fail_streak INTEGER NOT NULL DEFAULT 0,"
+            " checked_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+
+    def lookup(self, keys, now: float = None):
+        """返回仍在有效期内的结果 {key: 耗时或 None}，None 表示上次测试失败"""
+        now = time.time() if now is None else now
+        fresh = {}
+        keys = list(keys)
+        # 分批查询，避免超过 SQLite 参数个数上限
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT key, ok, latency FROM endpoints WHERE expires_at > ? "
+                f"AND key IN ({','.join('?' * len(batch))})", [now] + batch)
+            for key, ok, latency in rows:
+                fresh[key] = latency if ok else None
+        return fresh
+
+    def record(self, results, now: float = None):
+        """保存测试结果 {key: 耗时或 None}，按结果与连续失败次数计算有效期"""
+        now = time.time() if now is None else now
+        streaks = {}
+        keys = list(results)
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT key, fail_streak FROM endpoints WHERE key IN ({','.join('?' * len(batch))})", batch)
+            streaks.update(rows)
+
+        rows = []
+        for key, latency in results.items():
+            if latency is not None:
+                streak = 0
+                ttl = SUCCESS_TTL
+            else:
+                streak = streaks.get(key, 0) + 1
+                ttl = min(FAILURE_TTL * 2 ** (streak - 1), MAX_FAILURE_TTL)
+            # 加入随机抖动，避免大量端点在同一次运行中同时过期
+            expires_at = now + ttl * random.uniform(0.8, 1.0)
+            rows.append((key, int(latency is not None), latency, streak, now, expires_at))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO endpoints (key, ok, latency, fail_streak, checked_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.conn.execute("DELETE FROM endpoints WHERE checked_at < ?", (now - PRUNE_AFTER,))
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,98 @@
+"""
+进程内共享的 HTTP 会话
+
+所有脚本通过 get_session() 取得同一个带连接池的 requests.Session，
+在同一进程中运行多个任务时复用 TCP/TLS 连接。
+会话不设置默认 User-Agent，需要浏览器 UA 的脚本在请求时传入 headers。
+
+- 单主机并发：连接池以阻塞模式运行，同一主机同时借出的连接不超过 PER_HOST_LIMIT，
+  超出的请求等待连接归还（流式响应读完或关闭后归还），而不是另开连接
+- 重试：连接失败、读取超时以及 RETRY_STATUSES 中的状态码按指数退避重试，
+  等待时间在 [0, 退避上限] 内随机取值，多个任务同时失败时不会同步重试；
+  响应带 Retry-After 时按其等待，但不超过 BACKOFF_MAX
+- 超时：调用方未指定 timeout 时使用 DEFAULT_TIMEOUT，不会无限期挂起
+"""
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 连接池：缓存的主机数
+POOL_CONNECTIONS = 32
+
+# 同一主机同时借出的连接数上限
+PER_HOST_LIMIT = 8
+
+# 未指定 timeout 时的（连接, 读取）超时（秒）
+DEFAULT_TIMEOUT = (10, 30)
+
+# 重试次数与退避参数：第 n 次重试前最多等待 BACKOFF_FACTOR * 2^(n-1) 秒，不超过 BACKOFF_MAX
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+BACKOFF_MAX = 10
+
+# 可重试的状态码（限流与网关/服务端临时错误）
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_lock = threading.Lock()
+
+
+class JitteredRetry(Retry):
+    """
+    退避时间在 [0, 指数退避上限] 内均匀随机（full jitter），上限不超过 BACKOFF_MAX；
+    Retry-After 要求的等待同样不超过 BACKOFF_MAX，一次长 Retry-After 不会让定时任务停顿数小时
+    """
+
+    def get_backoff_time(self):
+        backoff = min(BACKOFF_MAX, super().get_backoff_time())
+        return random.uniform(0, backoff) if backoff > 0 else 0
+
+    def parse_retry_after(self, retry_after: str):
+        return min(BACKOFF_MAX, super().parse_retry_after(retry_after))
+
+
+class PooledAdapter(HTTPAdapter):
+    """请求未指定超时时使用 DEFAULT_TIMEOUT"""
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=DEFAULT_TIMEOUT if timeout is None else timeout, **kwargs)
+
+
+def create_retry():
+    """共享会话使用的重试策略；重试用尽后返回最后一次响应，由调用方 raise_for_status"""
+    return JitteredRetry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+def backoff_delay(attempt: int, response=None):
+    """
+    不经过共享会话的手动重试在第 attempt 次（从 0 开始）失败后的等待秒数：
+    响应带 Retry-After（秒数）时按其等待，否则与 JitteredRetry 相同的随机指数退避，均不超过 BACKOFF_MAX
+    """
+    retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+    if retry_after.strip().isdigit():
+        return min(BACKOFF_MAX, int(retry_after))
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_FACTOR * 2 ** attempt))
+
+
+def get_session():
+    """返回进程内共享的 Session（首次调用时创建）"""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = PooledAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=PER_HOST_LIMIT,
+                                    pool_block=True, max_retries=create_retry())
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
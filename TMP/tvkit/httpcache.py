@@ -0,0 +1,295 @@
+"""
+基于 ETag / Last-Modified 的条件请求缓存
+
+按 URL 把上次响应的校验头和正文保存在磁盘上，下次请求时携带
+If-None-Match / If-Modified-Since；上游返回 304 时直接复用缓存正文。
+缓存总大小超过上限时按最近使用时间淘汰。
+产物指纹、编码提示与输出指纹等附加记录（meta）连续 META_MAX_RUNS 次运行未用到时删除。
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+
+import requests
+
+from . import CACHE_DIR
+from .compress import compressed_paths
+
+# 正文缓存总大小上限（字节）
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# meta 记录连续这么多次运行（创建 ValidatorCache 的进程）未被读写时删除
+META_MAX_RUNS = 30
+
+
+class ValidatorCache:
+    def __init__(self, cache_dir: str = None, max_bytes: int = MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, "http")
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self.lock = threading.Lock()
+        # 本次运行中返回 304 的 URL
+        self.not_modified = set()
+        # meta_seen 记录每条 meta 最近一次被读写的运行序号
+        self.index = {"entries": {}, "meta": {}, "meta_seen": {}, "runs": 0}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.index["entries"] = data.get("entries", {})
+            self.index["meta"] = data.get("meta", {})
+            self.index["meta_seen"] = data.get("meta_seen", {})
+            self.index["runs"] = data.get("runs", 0)
+        except (OSError, ValueError):
+            pass
+        self.run = self.index["runs"] = self.index["runs"] + 1
+
+    def _body_path(self, url: str):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + ".body")
+
+    def request_headers(self, url: str):
+        """生成条件请求头"""
+        entry = self.index["entries"].get(url)
+        if not entry or not os.path.exists(self._body_path(url)):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load(self, url: str):
+        """读取缓存正文，返回 (bytes, content_type)，不存在时返回 (None, None)"""
+        entry = self.index["entries"].get(url)
+        if not entry:
+            return None, None
+        try:
+            with open(self._body_path(url), 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None, None
+        with self.lock:
+            entry["used"] = time.time()
+        return body, entry.get("content_type")
+
+    def open_body(self, url: str):
+        """以二进制流打开缓存正文，返回 (file, content_type)，不存在时返回 (None, None)"""
+        entry = self.index["entries"].get(url)
+        if not entry:
+            return None, None
+        try:
+            f = open(self._body_path(url), 'rb')
+        except OSError:
+            return None, None
+        with self.lock:
+            entry["used"] = time.time()
+        return f, entry.get("content_type")
+
+    def store(self, url: str, headers, body: bytes):
+        """保存响应正文；没有任何校验头的响应不缓存"""
+        self.store_file(url, headers, io.BytesIO(body), len(body))
+
+    def store_file(self, url: str, headers, fileobj, size: int):
+        """从文件对象复制正文到缓存，避免整体读入内存；没有任何校验头的响应不缓存"""
+        if not headers.get("ETag") and not headers.get("Last-Modified"):
+            return
+        if size > self.max_bytes:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._body_path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(fileobj, f)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.index["entries"][url] = {
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "content_type": headers.get("Content-Type"),
+                "size": size,
+                "used": time.time(),
+            }
+            self._evict()
+
+    def _evict(self):
+        """按最近使用时间淘汰，直到总大小不超过上限（调用方持有锁）"""
+        entries = self.index["entries"]
+        total = sum(e.get("size", 0) for e in entries.values())
+        for url in sorted(entries, key=lambda u: entries[u].get("used", 0)):
+            if total <= self.max_bytes:
+                break
+            total -= entries[url].get("size", 0)
+            del entries[url]
+            try:
+                os.remove(self._body_path(url))
+            except OSError:
+                pass
+
+    def _meta_get(self, key: str):
+        """读取 meta 记录并标记为本次运行用到（调用方持有锁）"""
+        value = self.index["meta"].get(key)
+        if value is not None:
+            self.index["meta_seen"][key] = self.run
+        return value
+
+    def _meta_set(self, key: str, value):
+        """写入 meta 记录（调用方持有锁）"""
+        self.index["meta"][key] = value
+        self.index["meta_seen"][key] = self.run
+
+    def _prune_meta(self):
+        """删除连续 META_MAX_RUNS 次运行未用到的 meta 记录（调用方持有锁）"""
+        meta, seen = self.index["meta"], self.index["meta_seen"]
+        for key in list(meta):
+            # 旧版索引没有 meta_seen，从本次运行开始计数
+            if self.run - seen.setdefault(key, self.run) > META_MAX_RUNS:
+                del meta[key]
+        for key in list(seen):
+            if key not in meta:
+                del seen[key]
+
+    def all_not_modified(self, urls):
+        """本次运行中这些 URL 是否全部返回了 304"""
+        urls = list(urls)
+        return bool(urls) and all(url in self.not_modified for url in urls)
+
+    def output_unchanged(self, urls, output_path: str, stamp: str):
+        """
+        所有源均返回 304、输出文件及其压缩副本存在且由同一版本脚本生成时返回 True，
+        调用方可跳过解析与写入
+        """
+        with self.lock:
+            same_stamp = self._meta_get(output_path) == stamp
+        return (same_stamp
+                and self.all_not_modified(urls)
+                and os.path.exists(output_path)
+                and all(os.path.exists(path) for path in compressed_paths(output_path)))
+
+    def mark_output(self, output_path: str, stamp: str):
+        """记录输出文件由哪个版本的脚本生成"""
+        with self.lock:
+            self._meta_set(output_path, stamp)
+
+    def note_artifact(self, url: str, data: bytes):
+        """
+        记录某个地址由本进程内的上游任务直接提供的内容
+        与上次提供的内容相同时视同 304，返回 True
+        """
+        digest = hashlib.sha1(data).hexdigest()
+        key = "artifact:" + url
+        with self.lock:
+            unchanged = self._meta_get(key) == digest
+            self._meta_set(key, digest)
+            if unchanged:
+                self.not_modified.add(url)
+        return unchanged
+
+    def encoding_hint(self, url: str):
+        """该 URL 上次识别出的正文编码"""
+        with self.lock:
+            return self._meta_get("encoding:" + url)
+
+    def remember_encoding(self, url: str, encoding: str):
+        with self.lock:
+            self._meta_set("encoding:" + url, encoding)
+
+    def save(self):
+        """写回索引文件"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self.lock:
+            self._prune_meta()
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    返回进程内共享的 ValidatorCache（首次调用时创建）
+    同一进程并行运行多个任务时共用一份索引，避免各自写回时互相覆盖
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ValidatorCache()
+    return _shared
+
+
+def conditional_get(session, url: str, cache: ValidatorCache, metrics=None, **kwargs):
+    """
+    发送条件 GET 请求
+    上游返回 304 时，用缓存正文构造一个 200 响应返回，并设置 response.from_cache = True，
+    调用方可以像普通响应一样使用 response.text / response.content
+    传入 Metrics 时记录字节数、耗时与缓存命中
+    """
+    start = time.perf_counter()
+    response = _conditional_get(session, url, cache, **kwargs)
+    if metrics is not None:
+        metrics.record_fetch(url, len(response.content), time.perf_counter() - start, response.from_cache)
+    return response
+
+
+def _conditional_get(session, url: str, cache: ValidatorCache, **kwargs):
+    base_headers = dict(kwargs.pop("headers", None) or {})
+    headers = dict(base_headers)
+    headers.update(cache.request_headers(url))
+    response = session.get(url, headers=headers, **kwargs)
+    response.from_cache = False
+    if response.status_code == 304:
+        body, content_type = cache.load(url)
+        if body is not None:
+            response.status_code = 200
+            response._content = body
+            if content_type:
+                response.headers["Content-Type"] = content_type
+            response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+            response.from_cache = True
+            with cache.lock:
+                cache.not_modified.add(url)
+            return response
+        # 缓存正文丢失，退回无条件请求
+        response = session.get(url, headers=base_headers, **kwargs)
+        response.from_cache = False
+    if response.status_code == 200:
+        cache.store(url, response.headers, response.content)
+    return response
+
+
+_package_stamp = None
+_package_stamp_lock = threading.Lock()
+
+
+def package_stamp():
+    """tvkit 包内全部 .py 文件的指纹（进程内只计算一次）"""
+    global _package_stamp
+    with _package_stamp_lock:
+        if _package_stamp is None:
+            package_dir = os.path.dirname(os.path.abspath(__file__))
+            digest = hashlib.sha1()
+            for name in sorted(os.listdir(package_dir)):
+                if name.endswith(".py"):
+                    with open(os.path.join(package_dir, name), 'rb') as f:
+                        digest.update(f"{name}\n".encode('utf-8'))
+                        digest.update(hashlib.sha1(f.read()).digest())
+            _package_stamp = digest.hexdigest()
+    return _package_stamp
+
+
+def script_stamp(path: str):
+    """
+    脚本文件内容与 tvkit 包的指纹：脚本（关键词等配置）或公共组件（解析、过滤、输出格式）
+    变化后不再跳过处理，按源缓存的结果也随之失效
+    """
+    with open(path, 'rb') as f:
+        script = f.read()
+    return hashlib.sha1(script + package_stamp().encode('ascii')).hexdigest()
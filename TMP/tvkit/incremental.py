@@ -0,0 +1,95 @@
+"""
+按源增量处理
+
+多源脚本中，只依赖单个源内容的阶段（排除区域、删除 genre 行、关键词过滤等）
+的结果只取决于源正文、脚本配置和 tvkit 的实现。SourceResultCache 以
+“脚本与 tvkit 包指纹（script_stamp）+ 源正文指纹”为键，把这些阶段处理后的行和统计保存在磁盘上：
+源未变化时直接读取上次的结果，只有变化的源重新解析过滤。
+跨源的阶段（去重、跨文件归属、存活检测、镜像排序）仍在合并后的行流上执行。
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+
+from . import CACHE_DIR
+from .tokenizer import tokenize
+
+
+class SourceResultCache:
+    def __init__(self, name: str, stamp: str, cache_dir: str = None):
+        """name 区分不同脚本；stamp 为脚本与 tvkit 包的指纹（script_stamp），变化后全部源重新处理"""
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, "sources", name)
+        self.stamp = stamp
+        self.lock = threading.Lock()
+        # 本次运行用到的条目，finish() 时删除其余过期条目
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, body):
+        return hashlib.sha1(f"{self.stamp}\n{body.fingerprint()}".encode('ascii')).hexdigest()
+
+    def _load(self, key: str):
+        """读取缓存的行与统计，不存在或损坏时返回 None"""
+        try:
+            with open(os.path.join(self.cache_dir, key + ".json"), 'r', encoding='utf-8') as f:
+                stats = Counter({tuple(k) if isinstance(k, list) else k: v for k, v in json.load(f)})
+            with open(os.path.join(self.cache_dir, key + ".txt"), 'r', encoding='utf-8') as f:
+                lines = f.read().split("\n") if os.fstat(f.fileno()).st_size else []
+        except (OSError, ValueError):
+            return None
+        return lines, stats
+
+    def process(self, body, stages, stats: Counter = None):
+        """
+        产出 body 经 stages(records, stats) 处理后的记录
+        命中缓存时不再读取源正文；未命中时边处理边写入缓存
+        """
+        key = self._key(body)
+        with self.lock:
+            self.used.add(key)
+        cached = self._load(key)
+        if cached is not None:
+            body.close()
+            lines, local_stats = cached
+            with self.lock:
+                self.hits += 1
+            if stats is not None:
+                stats.update(local_stats)
+            yield from tokenize(lines)
+            return
+
+        with self.lock:
+            self.misses += 1
+        local_stats = Counter()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = os.path.join(self.cache_dir, f"{key}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            first = True
+            for record in stages(tokenize(body.iter_lines()), local_stats):
+                if not first:
+                    f.write("\n")
+                f.write(record.raw)
+                first = False
+                yield record
+        with open(os.path.join(self.cache_dir, key + ".json"), 'w', encoding='utf-8') as f:
+            json.dump([[list(k) if isinstance(k, tuple) else k, v] for k, v in local_stats.items()],
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.cache_dir, key + ".txt"))
+        if stats is not None:
+            stats.update(local_stats)
+
+    def finish(self):
+        """删除本次未用到的条目（源内容或脚本已变化）"""
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.split(".", 1)[0] not in self.used:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
@@ -0,0 +1,93 @@
+"""
+流式 JSON 数组读取
+
+iter_json_array 按块接收正文，每解析出一个数组元素就立即产出，
+不把整个响应读入内存、也不构造完整的列表。顶层不是数组时整体作为一个元素产出。
+元素本身用标准库的 JSONDecoder.raw_decode 解析，只需在缓冲区中保留当前未解析完的部分。
+"""
+import codecs
+import json
+import re
+
+# JSON 空白
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# 数组元素之后可能出现的字符
+_DELIMITERS = frozenset(' \t\n\r,]')
+
+
+def _skip(buffer: str, pos: int):
+    return _WHITESPACE.match(buffer, pos).end()
+
+
+def iter_json_array(chunks, encoding: str = 'utf-8'):
+    """
+    逐个产出 JSON 数组的元素；chunks 为字节块（按 encoding 增量解码）或字符串块
+    格式错误或数据不完整时抛出 json.JSONDecodeError
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    buffer = ""
+    pos = 0
+    state = "start"  # start → first/value（数组元素）⇄ separator；顶层非数组时 single → done
+    chunks = iter(chunks)
+    eof = False
+
+    while True:
+        # 读入更多数据，丢弃已解析的部分
+        if not eof:
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+                chunk = text_decoder.decode(b"", final=True)
+            elif isinstance(chunk, bytes):
+                chunk = text_decoder.decode(chunk)
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            if not eof and not buffer:
+                continue
+
+        while True:
+            pos = _skip(buffer, pos)
+            if pos == len(buffer):
+                break
+            if state == "done":
+                # 顶层单值之后只允许空白
+                raise json.JSONDecodeError("Extra data", buffer, pos)
+            if state == "start":
+                if buffer[pos] == "[":
+                    pos += 1
+                    state = "first"
+                else:
+                    state = "single"
+                continue
+            if state == "separator":
+                if buffer[pos] == ",":
+                    pos += 1
+                    state = "value"
+                    continue
+                if buffer[pos] == "]":
+                    return
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+            if state == "first" and buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                break  # 元素尚不完整，等待更多数据
+            # 数字可能只解析了已到达的前缀（如 "1.5e" 解析为 1.5），
+            # 未到结尾时要求其后已出现分隔符，否则等待更多数据
+            if not eof and (end == len(buffer) or buffer[end] not in _DELIMITERS):
+                break
+            pos = end
+            yield item
+            state = "done" if state == "single" else "separator"
+
+        if eof:
+            if state == "done":
+                return
+            if state == "start":
+                raise json.JSONDecodeError("Expecting value", buffer, pos)
+            raise json.JSONDecodeError("Unterminated array", buffer, pos)
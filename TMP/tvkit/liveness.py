@@ -0,0 +1,204 @@
+"""
+流级别存活检测
+
+TCP 连接成功只说明端口开放，很多地址仍返回 404 或空的 HLS 清单。
+这里对 http(s) 地址发送 Range GET，只读取开头少量字节（m3u8 读取清单头部），
+把每个流判定为 alive / dead / redirect。请求通过带连接池的 Session 复用长连接，
+总并发与单主机并发都有上限。
+
+也可单独检查已生成的播放列表：
+    cd TMP && python -m tvkit.liveness ../rihou.txt ../my1.txt
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ALIVE = "alive"
+DEAD = "dead"
+REDIRECT = "redirect"
+
+# 检测并发数及单主机并发上限
+CHECK_CONCURRENCY = 32
+CHECK_PER_HOST = 4
+
+# 单次请求超时（秒）
+CHECK_TIMEOUT = 5
+
+# 普通流读取的字节数；m3u8 清单读取的字节数
+PEEK_BYTES = 2048
+MANIFEST_BYTES = 8192
+
+# 最多跟随的重定向次数
+MAX_REDIRECTS = 3
+
+
+def stream_check_from_env():
+    """TVKIT_STREAM_CHECK=1 时开启流级别存活检测（逐个请求流地址，较慢，默认关闭）"""
+    return os.environ.get("TVKIT_STREAM_CHECK") == "1"
+
+
+class StreamStatus(NamedTuple):
+    state: str
+    status_code: Optional[int]
+    latency: Optional[float]  # 首字节耗时（秒）
+    location: Optional[str] = None  # 重定向后的最终地址
+    reason: str = ""
+
+    @property
+    def ok(self):
+        return self.state != DEAD
+
+
+def _is_manifest(url: str, content_type: str, head: bytes):
+    return (urlsplit(url).path.lower().endswith(".m3u8")
+            or "mpegurl" in content_type.lower()
+            or head.lstrip().startswith(b"#EXTM3U"))
+
+
+class StreamChecker:
+    def __init__(self, concurrency: int = CHECK_CONCURRENCY, per_host: int = CHECK_PER_HOST,
+                 timeout: float = CHECK_TIMEOUT, session: requests.Session = None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        if session is None:
+            adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=per_host)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            self.session.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        self.host_sems = {}
+        self.lock = threading.Lock()
+        self.results = {}
+
+    def _host_sem(self, url: str):
+        host = urlsplit(url).netloc
+        with self.lock:
+            sem = self.host_sems.get(host)
+            if sem is None:
+                sem = self.host_sems[host] = threading.Semaphore(self.per_host)
+        return sem
+
+    def _fetch_head(self, url: str):
+        """发送 Range GET，返回 (响应, 开头字节, 首字节耗时)"""
+        start = time.monotonic()
+        response = self.session.get(url, headers={"Range": f"bytes=0-{MANIFEST_BYTES - 1}"},
+                                    stream=True, allow_redirects=False, timeout=self.timeout)
+        latency = time.monotonic() - start
+        with response:
+            head = b""
+            if response.status_code < 300:
+                limit = PEEK_BYTES
+                for chunk in response.iter_content(1024):
+                    if not head:
+                        latency = time.monotonic() - start
+                    head += chunk
+                    if len(head) >= limit:
+                        if limit == PEEK_BYTES and _is_manifest(url, response.headers.get("Content-Type", ""), head):
+                            limit = MANIFEST_BYTES
+                            continue
+                        break
+            return response, head, latency
+
+    def check(self, url: str):
+        """检测单个流"""
+        with self.lock:
+            cached = self.results.get(url)
+        if cached is not None:
+            return cached
+        status = self._check(url)
+        with self.lock:
+            self.results[url] = status
+        return status
+
+    def _check(self, url: str):
+        current = url
+        try:
+            for hop in range(MAX_REDIRECTS + 1):
+                with self._host_sem(current):
+                    response, head, latency = self._fetch_head(current)
+                code = response.status_code
+                if 300 <= code < 400 and response.headers.get("Location"):
+                    current = urljoin(current, response.headers["Location"])
+                    continue
+                if code >= 400:
+                    return StreamStatus(DEAD, code, latency, reason=f"HTTP {code}")
+                if not head:
+                    return StreamStatus(DEAD, code, latency, reason="空响应")
+                if _is_manifest(current, response.headers.get("Content-Type", ""), head):
+                    if b"#EXTINF" not in head and b"#EXT-X-STREAM-INF" not in head:
+                        return StreamStatus(DEAD, code, latency, reason="空清单")
+                if hop:
+                    return StreamStatus(REDIRECT, code, latency, current)
+                return StreamStatus(ALIVE, code, latency)
+            return StreamStatus(DEAD, None, None, current, reason="重定向过多")
+        except requests.RequestException as e:
+            return StreamStatus(DEAD, None, None, reason=type(e).__name__)
+
+    def latency(self, url: str):
+        """已检测地址的首字节耗时，未检测或失效时返回 None"""
+        status = self.results.get(url)
+        if status is None or not status.ok:
+            return None
+        return status.latency
+
+    def check_many(self, urls):
+        """并发检测多个流，返回 {url: StreamStatus}"""
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(urls))) as executor:
+            return dict(zip(urls, executor.map(self.check, urls)))
+
+    def close(self):
+        self.session.close()
+
+
+def check_playlist(path: str, checker: StreamChecker, write: bool = False):
+    """检查 txt 播放列表中的 http(s) 地址，write 为 True 时删除 dead 行并写回"""
+    from .pipeline import DEDUP_SCHEMES
+    from .tokenizer import parse_line
+    from .writer import write_text
+
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    records = [parse_line(line) for line in lines]
+    urls = [r.url for r in records if r.scheme in DEDUP_SCHEMES]
+    results = checker.check_many(urls)
+    counts = {ALIVE: 0, DEAD: 0, REDIRECT: 0}
+    for status in results.values():
+        counts[status.state] += 1
+    print(f"{path}: {len(results)} 个地址  存活 {counts[ALIVE]}  重定向 {counts[REDIRECT]}  失效 {counts[DEAD]}")
+    if write and counts[DEAD]:
+        kept = [line for line, r in zip(lines, records)
+                if r.scheme not in DEDUP_SCHEMES or results[r.url].ok]
+        write_text(path, '\n'.join(kept))
+        print(f"  已删除 {len(lines) - len(kept)} 行")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='检测播放列表中直播流的存活状态')
+    parser.add_argument('files', nargs='+', help='txt 播放列表')
+    parser.add_argument('-w', '--write', action='store_true', help='删除失效行并写回文件')
+    parser.add_argument('-c', '--concurrency', type=int, default=CHECK_CONCURRENCY, help='并发数')
+    parser.add_argument('-t', '--timeout', type=float, default=CHECK_TIMEOUT, help='单次请求超时（秒）')
+    args = parser.parse_args()
+
+    checker = StreamChecker(concurrency=args.concurrency, timeout=args.timeout)
+    try:
+        for path in args.files:
+            check_playlist(path, checker, args.write)
+    finally:
+        checker.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+单遍流式 M3U 解析
+
+逐行读取扩展 M3U，每个 #EXTINF 行只用一个预编译正则扫描一次，取出全部 key="value" 属性
+（group-title、tvg-id、tvg-name、tvg-logo 等），与其后的 URL 行组成一个 Channel：
+raw 为 “名称,URL” 形式（与 txt 源的行格式一致，后续阶段与写文件可直接使用），
+genre 为 group-title，attrs 为属性字典。
+输入可以是文本行、字节行或文件对象，解析按行流式进行，耗时与源大小成线性、内存占用恒定。
+"""
+import re
+
+from .channel import Channel
+from .tokenizer import TOKEN_PATTERN
+
+# #EXTINF 中的 key="value" 属性（属性之间以空白分隔；要求前导空白使扫描在多数位置立即失败）
+ATTR_PATTERN = re.compile(r'\s([\w-]+)="([^"]*)"')
+
+
+def parse_m3u(lines):
+    """
+    逐行解析 M3U，产出 Channel
+    名称为 #EXTINF 行最后一个逗号之后的文本；url 保留整行，协议/主机/端口取行内第一个地址。
+    #EXTINF 之后的第一个非指令行作为其 URL，中间的 #EXTVLCOPT 等指令行跳过；
+    不跟在 #EXTINF 之后的 URL 行与 // 注释行忽略。字节行按 UTF-8 解码
+    """
+    find_attrs = ATTR_PATTERN.findall
+    search_url = TOKEN_PATTERN.search
+    extinf = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.strip()
+        if not line:
+            continue
+        if line[0] == "#":
+            if line.startswith("#EXTINF"):
+                extinf = line
+            continue
+        if extinf is None or line.startswith("//"):
+            continue
+
+        attrs = dict(find_attrs(extinf))
+        comma = extinf.rfind(",")
+        name = extinf[comma + 1:].strip() if comma >= 0 else ""
+        extinf = None
+        raw = f"{name},{line}"
+        genre = attrs.get("group-title", "")
+        m = search_url(line)
+        kind = m.lastgroup if m is not None else None
+        if kind == "url":
+            scheme, host, port, path = m.group("scheme", "host", "port", "path")
+            yield Channel(raw, name, line, scheme.lower(), host, int(port) if port else None, path, genre,
+                          attrs=attrs)
+        elif kind == "bare_port":
+            yield Channel(raw, name, line, host=m.group("bare_host"), port=int(m.group("bare_port")),
+                          genre=genre, attrs=attrs)
+        else:
+            yield Channel(raw, name, line, genre=genre, attrs=attrs)
@@ -0,0 +1,50 @@
+"""
+多关键词匹配
+
+把一组关键词编译成一个正则（长关键词优先的备选式），每行只扫描一次，
+不必对每个关键词分别执行 ``in`` 与 ``lower()``。
+同一组关键词只编译一次，各脚本通过 get_matcher 共享。
+"""
+import re
+from functools import lru_cache
+
+
+class KeywordMatcher:
+    def __init__(self, keywords, ignore_case: bool = False):
+        self.ignore_case = ignore_case
+        # 去重并保持原顺序；匹配文本 → 原关键词，用于报告命中的关键词
+        self.keywords = list(dict.fromkeys(k for k in keywords if k))
+        self.lookup = {}
+        for keyword in self.keywords:
+            self.lookup.setdefault(keyword.lower() if ignore_case else keyword, keyword)
+        if self.keywords:
+            # 长关键词排在前面，保证报告的是最具体的关键词
+            alternation = "|".join(re.escape(k) for k in sorted(self.keywords, key=len, reverse=True))
+            self.pattern = re.compile(alternation, re.IGNORECASE if ignore_case else 0)
+        else:
+            self.pattern = None
+
+    def search(self, text: str):
+        """返回 text 中命中的关键词，未命中返回 None"""
+        if self.pattern is None:
+            return None
+        m = self.pattern.search(text)
+        if not m:
+            return None
+        found = m.group(0)
+        return self.lookup.get(found.lower() if self.ignore_case else found, found)
+
+    def __contains__(self, text: str):
+        return self.pattern is not None and self.pattern.search(text) is not None
+
+
+@lru_cache(maxsize=None)
+def _cached_matcher(keywords: tuple, ignore_case: bool):
+    return KeywordMatcher(keywords, ignore_case)
+
+
+def get_matcher(keywords, ignore_case: bool = False):
+    """获取（或复用已编译的）关键词匹配器；传入 KeywordMatcher 时原样返回"""
+    if isinstance(keywords, KeywordMatcher):
+        return keywords
+    return _cached_matcher(tuple(keywords), ignore_case)
@@ -0,0 +1,298 @@
+"""
+结构化运行指标
+
+各脚本通过 Metrics 记录：
+- 阶段耗时：stage() 记录墙钟与 CPU 时间（CPU 为进程级，并行运行多个任务时包含其他任务）；
+  启用指标输出时另记独占墙钟时间，其中消费的流式阶段与嵌套阶段的耗时不计入
+- 流式阶段：track() 包装生成器阶段，记录各阶段独占的墙钟时间与输入/输出行数；
+  生成器层层嵌套，按调用栈把下游等待上游的时间从下游扣除
+- 计数器：获取字节数、缓存命中、管道 stats 中的事件等，可带标签（如 source=URL）
+- 直方图：连通性测试延迟等
+
+设置环境变量 TVKIT_METRICS=<文件> 时，脚本结束调用 emit() 输出：
+文件名以 .prom 结尾时写 Prometheus 文本格式（本进程内所有任务，原子替换），
+否则按 JSON lines 追加，每个样本一行。未设置时 track() 原样返回，不增加逐行开销。
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .writer import write_text
+
+METRICS_PATH = os.environ.get("TVKIT_METRICS")
+
+# 延迟直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+_local = threading.local()
+
+
+def _stack():
+    """本线程正在计时的阶段栈，每帧为 [等待内层阶段的时间, 阶段名, 是否流式阶段]"""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _labels_key(labels: dict):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Prometheus 形式的累计桶：[(上界, 累计数)]，最后一项上界为 +Inf"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class _TrackedStage:
+    """被跟踪的流式阶段；每次取下一项时压栈（无论成败都会出栈），上游阶段的耗时从本阶段扣除"""
+
+    def __init__(self, metrics, name: str, records):
+        self.metrics = metrics
+        self.name = name
+        self.iterator = iter(records)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        stack = _stack()
+        frame = [0.0, self.name, True]
+        stack.append(frame)
+        start = time.perf_counter()
+        produced = False
+        try:
+            item = next(self.iterator)
+            produced = True
+        finally:
+            # 结束或上游抛出异常时同样出栈，栈上不会留下失效的帧
+            self._account(stack, start, frame, produced)
+        return item
+
+    def _account(self, stack, start, frame, produced: bool):
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        parent = stack[-1] if stack else None
+        if parent is not None:
+            parent[0] += elapsed
+        metrics = self.metrics
+        with metrics.lock:
+            seconds = metrics.stream_seconds
+            seconds[self.name] = seconds.get(self.name, 0.0) + elapsed - frame[0]
+            if produced:
+                lines = metrics.stream_lines
+                lines[(self.name, "out")] = lines.get((self.name, "out"), 0) + 1
+                if parent is not None and parent[2]:
+                    lines[(parent[1], "in")] = lines.get((parent[1], "in"), 0) + 1
+
+
+class Metrics:
+    def __init__(self, job: str, enabled: bool = None):
+        self.job = job
+        self.enabled = bool(METRICS_PATH) if enabled is None else enabled
+        self.lock = threading.Lock()
+        self.stages = {}          # 阶段名 → [墙钟秒, CPU秒, 次数]
+        self.stage_self_seconds = {}  # 阶段名 → 独占墙钟秒（仅启用时记录）
+        self.stream_seconds = {}  # 流式阶段名 → 独占墙钟秒
+        self.stream_lines = {}    # (阶段名, "in"/"out") → 行数
+        self.counters = {}        # (名称, 标签) → 数值
+        self.histograms = {}      # (名称, 标签) → Histogram
+        with _registry_lock:
+            _registry.append(self)
+
+    @contextmanager
+    def stage(self, name: str):
+        """记录一个阶段的墙钟与 CPU 时间（可多次进入，累加）；启用时另记独占墙钟时间"""
+        frame = None
+        if self.enabled:
+            frame = [0.0, name, False]
+            _stack().append(frame)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if frame is not None:
+                stack = _stack()
+                stack.pop()
+                if stack:
+                    stack[-1][0] += wall
+            with self.lock:
+                entry = self.stages.setdefault(name, [0.0, 0.0, 0])
+                entry[0] += wall
+                entry[1] += cpu
+                entry[2] += 1
+                if frame is not None:
+                    seconds = self.stage_self_seconds
+                    seconds[name] = seconds.get(name, 0.0) + wall - frame[0]
+
+    def track(self, name: str, records):
+        """包装流式阶段；未启用指标输出时原样返回"""
+        if not self.enabled:
+            return records
+        return _TrackedStage(self, name, records)
+
+    def count(self, name: str, value=1, /, **labels):
+        key = (name, _labels_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, /, **labels):
+        key = (name, _labels_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def count_lines(self, stage: str, lines_in: int, lines_out: int):
+        """非流式阶段的输入/输出行数（与 track() 记录的行数同一指标）"""
+        with self.lock:
+            lines = self.stream_lines
+            lines[(stage, "in")] = lines.get((stage, "in"), 0) + lines_in
+            lines[(stage, "out")] = lines.get((stage, "out"), 0) + lines_out
+
+    def record_fetch(self, url: str, size: int, seconds: float, from_cache: bool = False):
+        """一次源获取：字节数、耗时与 HTTP 缓存命中（304 或进程内产物）"""
+        self.count("fetch_bytes", size, source=url)
+        self.count("fetch_seconds", seconds, source=url)
+        self.count("cache_hits" if from_cache else "cache_misses", kind="http")
+
+    def record_stats(self, stats):
+        """
+        把管道阶段的 stats（Counter）计入 events 计数器
+        字符串键记为 event 标签；(类别, 值) 键记为 event 与 detail 标签
+        """
+        for key, value in stats.items():
+            if isinstance(key, tuple):
+                self.count("events", value, event=key[0], detail=key[1])
+            else:
+                self.count("events", value, event=key)
+
+    def samples(self):
+        """所有样本：[(指标名, 标签 dict, 数值)]；直方图另由 histograms 提供"""
+        job = {"job": self.job}
+        result = []
+        with self.lock:
+            for stage, (wall, cpu, calls) in self.stages.items():
+                result.append(("stage_wall_seconds", dict(job, stage=stage), wall))
+                result.append(("stage_cpu_seconds", dict(job, stage=stage), cpu))
+            for stage, seconds in self.stage_self_seconds.items():
+                result.append(("stage_self_seconds", dict(job, stage=stage), seconds))
+            for stage, seconds in self.stream_seconds.items():
+                result.append(("stream_stage_seconds", dict(job, stage=stage), seconds))
+            for (stage, direction), lines in self.stream_lines.items():
+                result.append(("stage_lines", dict(job, stage=stage, direction=direction), lines))
+            for (name, labels), value in self.counters.items():
+                result.append((name, dict(job, **dict(labels)), value))
+        return result
+
+    def to_json_lines(self):
+        ts = round(time.time(), 3)
+        lines = [json.dumps({"ts": ts, "metric": name, "labels": labels, "value": value}, ensure_ascii=False)
+                 for name, labels, value in self.samples()]
+        with self.lock:
+            for (name, labels), histogram in self.histograms.items():
+                lines.append(json.dumps({
+                    "ts": ts, "metric": name, "labels": dict({"job": self.job}, **dict(labels)),
+                    "buckets": {("+Inf" if b == float("inf") else str(b)): c for b, c in histogram.cumulative()},
+                    "sum": histogram.sum, "count": histogram.count,
+                }, ensure_ascii=False))
+        return lines
+
+    def emit(self, path: str = None):
+        """按 TVKIT_METRICS（或 path）输出；未设置时不做任何事"""
+        path = path or METRICS_PATH
+        if not path:
+            return
+        if path.endswith(".prom"):
+            write_text(path, prometheus_text())
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for line in self.to_json_lines():
+                f.write(line + "\n")
+
+
+def run_processor(processor):
+    """
+    运行 processor.process() 并返回其结果（供各脚本的 main() 与 run_jobs.py 调用）
+    无论成败，结束时调用 processor.close()（如有）、把 processor.stats（如有）计入指标并输出
+    """
+    try:
+        return processor.process()
+    finally:
+        close = getattr(processor, "close", None)
+        if close is not None:
+            close()
+        stats = getattr(processor, "stats", None)
+        if stats:
+            processor.metrics.record_stats(stats)
+        processor.metrics.emit()
+
+
+def _escape(value: str):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def prometheus_text():
+    """本进程内所有 Metrics 的 Prometheus 文本格式"""
+    with _registry_lock:
+        registry = list(_registry)
+    samples = {}
+    histograms = {}
+    for metrics in registry:
+        for name, labels, value in metrics.samples():
+            samples.setdefault(name, []).append((labels, value))
+        with metrics.lock:
+            for (name, labels), histogram in metrics.histograms.items():
+                histograms.setdefault(name, []).append((dict({"job": metrics.job}, **dict(labels)), histogram))
+
+    lines = []
+    for name, entries in samples.items():
+        lines.append(f"# TYPE tvkit_{name} gauge")
+        for labels, value in entries:
+            lines.append(f"tvkit_{name}{_format_labels(labels)} {value}")
+    for name, entries in histograms.items():
+        lines.append(f"# TYPE tvkit_{name} histogram")
+        for labels, histogram in entries:
+            for bound, count in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"tvkit_{name}_bucket{_format_labels(dict(labels, le=le))} {count}")
+            lines.append(f"tvkit_{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"tvkit_{name}_count{_format_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,287 @@
+"""
+流式行处理管道
+
+源正文先以流的方式落盘（缓存文件或临时文件），之后各阶段以生成器串联：
+读取行 → 解析为 Channel → 排除区域 → 删除 genre 行 → 关键词过滤 → URL 去重 → 写文件。
+任意时刻内存中只有当前处理的一行，峰值内存与源大小无关。
+"""
+import hashlib
+import io
+import os
+import tempfile
+import time
+
+from . import artifacts
+from .canonical import url_key
+from .emitters import ChannelWriter, output_paths
+from .encoding import SNIFF_BYTES, sniff
+from .matcher import get_matcher
+from .tokenizer import tokenize
+
+# 下载与解码的块大小
+CHUNK_SIZE = 64 * 1024
+
+# 参与去重的协议
+DEDUP_SCHEMES = ("http", "https")
+
+
+class SourceBody:
+    """已落盘的源正文，可按行流式读取"""
+
+    def __init__(self, url: str, fileobj, size: int, encoding: str, from_cache: bool = False):
+        self.url = url
+        self.fileobj = fileobj
+        self.size = size
+        self.encoding = encoding
+        self.from_cache = from_cache
+        self._fingerprint = None
+
+    def fingerprint(self):
+        """正文内容的 SHA-1 指纹（按块计算，不整体读入内存）"""
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+            self.fileobj.seek(0)
+            for chunk in iter(lambda: self.fileobj.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def iter_lines(self):
+        """逐行解码，产出去除首尾空白后的非空行，读完自动关闭"""
+        try:
+            self.fileobj.seek(0)
+            text = io.TextIOWrapper(self.fileobj, encoding=self.encoding, errors='ignore', newline=None)
+            for line in text:
+                line = line.strip()
+                if line:
+                    yield line
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            self.fileobj.close()
+        except Exception:
+            pass
+
+
+def fetch_source(session, url: str, cache=None, encoding=None, metrics=None, **kwargs):
+    """
+    流式下载一个源并落盘，返回 SourceBody
+    传入 ValidatorCache 时发送条件请求，304 时直接打开缓存正文
+    本进程中的上游任务已登记该地址的产物时直接使用内存中的内容
+    编码由正文前缀识别（见 tvkit.encoding）；encoding 为字符串时固定使用，
+    为元组/列表时作为候选编码
+    传入 Metrics 时记录字节数、耗时与缓存命中
+    """
+    start = time.perf_counter()
+    body = _fetch_source(session, url, cache, encoding, **kwargs)
+    if metrics is not None:
+        metrics.record_fetch(url, body.size, time.perf_counter() - start, body.from_cache)
+    return body
+
+
+def _fetch_source(session, url: str, cache, encoding, **kwargs):
+    data = artifacts.lookup(url)
+    if data is not None:
+        from_cache = cache.note_artifact(url, data) if cache is not None else False
+        prefix = data[:SNIFF_BYTES]
+        return SourceBody(url, io.BytesIO(data), len(data),
+                          sniff(url, prefix, None, encoding, cache, final=len(data) <= SNIFF_BYTES),
+                          from_cache=from_cache)
+
+    base_headers = dict(kwargs.pop("headers", None) or {})
+    headers = dict(base_headers)
+    if cache is not None:
+        headers.update(cache.request_headers(url))
+    response = session.get(url, headers=headers, stream=True, **kwargs)
+    if response.status_code == 304:
+        response.close()
+        fileobj = None
+        if cache is not None:
+            fileobj, content_type = cache.open_body(url)
+        if fileobj is not None:
+            with cache.lock:
+                cache.not_modified.add(url)
+            prefix = fileobj.read(SNIFF_BYTES)
+            size = os.fstat(fileobj.fileno()).st_size
+            return SourceBody(url, fileobj, size,
+                              sniff(url, prefix, content_type, encoding, cache, final=size <= SNIFF_BYTES),
+                              from_cache=True)
+        # 缓存正文丢失，退回无条件请求
+        response = session.get(url, headers=base_headers, stream=True, **kwargs)
+
+    with response:
+        response.raise_for_status()
+        spool = tempfile.TemporaryFile()
+        size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            spool.write(chunk)
+            size += len(chunk)
+        if cache is not None:
+            spool.seek(0)
+            cache.store_file(url, response.headers, spool, size)
+    spool.seek(0)
+    prefix = spool.read(SNIFF_BYTES)
+    content_type = response.headers.get("Content-Type")
+    return SourceBody(url, spool, size,
+                      sniff(url, prefix, content_type, encoding, cache, final=size <= SNIFF_BYTES))
+
+
+def chain_sources(bodies):
+    """按顺序串联多个源的行并解析为 Channel，跳过获取失败的源"""
+    for body in bodies:
+        if body is not None:
+            yield from tokenize(body.iter_lines())
+
+
+def close_sources(bodies):
+    """关闭未读取的源（例如跳过处理时）"""
+    for body in bodies:
+        if body is not None:
+            body.close()
+
+
+def exclude_sections(records, keywords, stats=None, keep_genre=True):
+    """
+    排除 genre 名称包含关键词的整个区域
+    keep_genre 为 True 时保留未排除区域的 genre 行
+    stats 中 ("excluded", 关键词) 记录各关键词排除的区域数
+    """
+    matcher = get_matcher(keywords)
+    in_excluded_section = False
+    for record in records:
+        if record.is_genre:
+            keyword = matcher.search(record.raw)
+            in_excluded_section = keyword is not None
+            if in_excluded_section:
+                if stats is not None:
+                    stats["excluded_sections"] += 1
+                    stats[("excluded", keyword)] += 1
+                continue
+            if keep_genre:
+                yield record
+        elif in_excluded_section:
+            if stats is not None:
+                stats["excluded_lines"] += 1
+        else:
+            yield record
+
+
+def drop_genre_lines(records):
+    """删除 genre 行"""
+    for record in records:
+        if not record.is_genre:
+            yield record
+
+
+def filter_keywords(records, keywords, stats=None):
+    """
+    删除包含任一关键词的行（不区分大小写）
+    stats 中 ("filtered", 关键词) 记录各关键词过滤的行数
+    """
+    matcher = get_matcher(keywords, ignore_case=True)
+    for record in records:
+        keyword = matcher.search(record.raw)
+        if keyword is not None:
+            if stats is not None:
+                stats["filtered"] += 1
+                stats[("filtered", keyword)] += 1
+            continue
+        yield record
+
+
+def keyword_hits(stats, kind: str, top: int = 5):
+    """从 stats 中取出命中次数最多的关键词，格式化为 "关键词×次数" 文本"""
+    hits = sorted(((key[1], n) for key, n in stats.items()
+                   if isinstance(key, tuple) and key[0] == kind), key=lambda item: -item[1])
+    return ", ".join(f"{keyword}×{n}" for keyword, n in hits[:top])
+
+
+def dedup_by_url(records, seen_urls=None, stats=None):
+    """
+    按行内第一个 http(s) URL 去重，没有 URL 的行原样保留
+    URL 先经 tvkit.canonical 规范化，默认端口、参数顺序等写法差异不影响去重
+    seen_urls 保存规范化 URL 的整数标识（url_key），可跨调用共享
+    """
+    if seen_urls is None:
+        seen_urls = set()
+    for record in records:
+        if record.scheme in DEDUP_SCHEMES:
+            key = url_key(record.url)
+            if key in seen_urls:
+                if stats is not None:
+                    stats["duplicates"] += 1
+                continue
+            seen_urls.add(key)
+        yield record
+
+
+def drop_owned(records, index, owner: str, stats=None):
+    """
+    删除已被优先级更高的输出文件拥有的 http(s) URL（见 tvkit.urlindex）
+    stats["owned_elsewhere"] 记录删除的行数
+    """
+    for record in records:
+        if record.scheme in DEDUP_SCHEMES and index.outranked(url_key(record.url), owner):
+            if stats is not None:
+                stats["owned_elsewhere"] += 1
+            continue
+        yield record
+
+
+def collect_urls(records, keys: set):
+    """记录经过的 http(s) URL 的 url_key，记录本身原样产出"""
+    for record in records:
+        if record.scheme in DEDUP_SCHEMES:
+            keys.add(url_key(record.url))
+        yield record
+
+
+def filter_alive(records, checker, stats=None, batch: int = 512):
+    """
+    用 StreamChecker 检测 http(s) 地址，删除判定为 dead 的行
+    按批缓冲 batch 条记录并发检测，内存占用有上限且输出顺序不变
+    """
+    def flush(buffered):
+        results = checker.check_many(r.url for r in buffered if r.scheme in DEDUP_SCHEMES)
+        for record in buffered:
+            status = results.get(record.url) if record.scheme in DEDUP_SCHEMES else None
+            if status is not None and stats is not None:
+                stats[("stream", status.state)] += 1
+            if status is None or status.ok:
+                yield record
+            elif stats is not None:
+                stats["dead"] += 1
+
+    buffered = []
+    for record in records:
+        buffered.append(record)
+        if len(buffered) >= batch:
+            yield from flush(buffered)
+            buffered = []
+    if buffered:
+        yield from flush(buffered)
+
+
+def write_lines(filename: str, lines, first_line: str = None):
+    """
+    流式写入文件（行可以是字符串或 Channel），行之间以换行分隔（末尾不追加换行）
+    返回写入的行数（不含首行）；没有任何行时不创建/覆盖文件，返回 0
+    经 AtomicWriter 写入：内容与原文件相同时不替换，读者不会看到写了一半的文件。
+    TVKIT_OUTPUT_FORMATS 指定了其他格式时，同一遍中一并写出同名的 .m3u/.json 文件
+    """
+    lines = iter(lines)
+    try:
+        line = next(lines)
+    except StopIteration:
+        return 0
+    count = 1
+    with ChannelWriter(output_paths(filename)) as out:
+        if first_line is not None:
+            out.write(first_line)
+        out.write(line)
+        for line in lines:
+            out.write(line)
+            count += 1
+    return count
@@ -0,0 +1,126 @@
+"""
+基于 asyncio 的 TCP 连通性测试
+
+使用非阻塞 socket 同时发起大量连接，总并发与单主机并发分别受限，
+并设置全局截止时间：到期仍未完成的连接一律按失败处理。
+"""
+import asyncio
+import socket
+import time
+
+from .dns import resolve
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 单个连接超时（秒）
+CONNECT_TIMEOUT = 3
+
+# 同时进行中的连接数上限
+PROBE_CONCURRENCY = 1000
+
+# 同一主机同时进行中的连接数上限
+PER_HOST_LIMIT = 16
+
+# 全部测试的截止时间（秒）
+PROBE_DEADLINE = 30
+
+
+def _raise_nofile_limit(wanted: int):
+    """尽量把打开文件数软限制提高到 wanted，返回实际可用的并发数"""
+    if resource is None:
+        return wanted
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < wanted + 64:
+            new_soft = min(hard, wanted + 64) if hard != resource.RLIM_INFINITY else wanted + 64
+            resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+            soft = new_soft
+        return max(1, min(wanted, soft - 64))
+    except (ValueError, OSError):
+        return wanted
+
+
+def _is_ip(host: str):
+    try:
+        socket.inet_pton(socket.AF_INET6 if ":" in host else socket.AF_INET, host)
+        return True
+    except OSError:
+        return False
+
+
+# _connect 在域名解析失败时的返回值，与连接失败（None）区分
+_UNRESOLVED = object()
+
+
+async def _connect(loop, host: str, port: int, timeout: float):
+    """
+    建立一次 TCP 连接，成功返回耗时（秒），失败返回 None
+    域名先经 tvkit.dns 解析（在线程池中进行，计入超时），解析失败返回 _UNRESOLVED
+    """
+    start = time.monotonic()
+    if _is_ip(host):
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        address = host
+    else:
+        try:
+            family, address = await asyncio.wait_for(loop.run_in_executor(None, resolve, host), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return _UNRESOLVED
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        remaining = max(0.0, timeout - (time.monotonic() - start))
+        await asyncio.wait_for(loop.sock_connect(sock, (address, port)), remaining)
+        return time.monotonic() - start
+    except (OSError, asyncio.TimeoutError):
+        return None
+    finally:
+        sock.close()
+
+
+async def _probe_all(endpoints, timeout, concurrency, per_host, deadline, progress):
+    loop = asyncio.get_running_loop()
+    results = [None] * len(endpoints)
+    finished = [False] * len(endpoints)
+    unresolved = set()
+    global_sem = asyncio.Semaphore(concurrency)
+    host_sems = {}
+
+    async def probe(i, host, port):
+        host_sem = host_sems.setdefault(host, asyncio.Semaphore(per_host))
+        async with global_sem, host_sem:
+            latency = await _connect(loop, host, port, timeout)
+        if latency is _UNRESOLVED:
+            unresolved.add(i)
+            latency = None
+        results[i] = latency
+        finished[i] = True
+        if progress is not None:
+            progress(i, results[i])
+
+    tasks = [asyncio.ensure_future(probe(i, host, port)) for i, (host, port) in enumerate(endpoints)]
+    if not tasks:
+        return results, set(), unresolved
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    return results, {i for i, ok in enumerate(finished) if not ok}, unresolved
+
+
+def probe_endpoints(endpoints, timeout: float = CONNECT_TIMEOUT, concurrency: int = PROBE_CONCURRENCY,
+                    per_host: int = PER_HOST_LIMIT, deadline: float = PROBE_DEADLINE, progress=None):
+    """
+    测试 [(host, port), ...] 的 TCP 连通性
+    返回 (结果列表, 未完成集合, 解析失败集合)：结果列表与 endpoints 顺序一致，连接成功为耗时（秒），否则为 None；
+    未完成集合为到截止时间仍未测完而被取消的端点下标，它们的 None 并不表示连接失败；
+    解析失败集合为域名无法解析（未发起连接）的端点下标
+    progress(i, latency) 在每个端点测完时调用
+    """
+    endpoints = list(endpoints)
+    concurrency = _raise_nofile_limit(concurrency)
+    return asyncio.run(_probe_all(endpoints, timeout, concurrency, per_host, deadline, progress))
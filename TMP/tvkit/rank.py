@@ -0,0 +1,63 @@
+"""
+按延迟排序镜像
+
+同一频道常有几十个镜像地址。这里按频道名分组，组内按实测延迟（连接耗时或首字节耗时）
+升序排列，只保留最快的 N 个；没有测得延迟的地址排在后面并保持原有顺序。
+组内一个延迟都没有测得时无从比较，整组原样保留，不按到达顺序截断。
+频道按首次出现的顺序输出。
+"""
+import os
+import re
+
+# 频道名比较时忽略空白、连字符与大小写，如 "CCTV-1" 与 "cctv 1"
+_NAME_NOISE = re.compile(r'[\s\-_]+')
+
+
+def best_n_from_env(default: int = 0):
+    """
+    TVKIT_BEST_N：每个频道保留的最快镜像数（0 表示不排序、不截断）
+    延迟优先使用流检测的首字节耗时，否则使用 TCP 连接耗时；不是非负整数时打印提示并使用 default
+    """
+    value = os.environ.get("TVKIT_BEST_N", "").strip()
+    if not value:
+        return default
+    try:
+        best_n = int(value)
+    except ValueError:
+        best_n = -1
+    if best_n < 0:
+        print(f"忽略无效的 TVKIT_BEST_N={value!r}（应为非负整数），使用 {default}")
+        return default
+    return best_n
+
+
+def channel_key(name: str):
+    return _NAME_NOISE.sub("", name).upper()
+
+
+def rank_mirrors(records, latency_of, best_n: int = 0, stats=None):
+    """
+    按频道名分组并按 latency_of(record) 排序，best_n > 0 时每个频道只保留前 best_n 个
+    没有任何实测延迟的组不截断，stats["unranked"] 记录这类组保留的行数
+    需要看到一个频道的全部镜像，因此会缓冲传入的全部记录
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault(channel_key(record.name), []).append(record)
+
+    for mirrors in groups.values():
+        if len(mirrors) > 1:
+            latencies = [latency_of(record) for record in mirrors]
+            if all(latency is None for latency in latencies):
+                if stats is not None and best_n > 0 and len(mirrors) > best_n:
+                    stats["unranked"] += len(mirrors)
+                yield from mirrors
+                continue
+            order = sorted(range(len(mirrors)),
+                           key=lambda i: (latencies[i] is None, latencies[i] or 0.0, i))
+            mirrors = [mirrors[i] for i in order]
+        if best_n > 0 and len(mirrors) > best_n:
+            if stats is not None:
+                stats["ranked_out"] += len(mirrors) - best_n
+            mirrors = mirrors[:best_n]
+        yield from mirrors
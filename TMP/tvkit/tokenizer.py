@@ -0,0 +1,44 @@
+"""
+单遍行解析
+
+每行 ``名称,URL`` 只用一个预编译正则扫描一次，解析为 Channel：
+名称、URL、协议、主机、端口、路径，以及所属 genre（区域名）。
+后续的排除、过滤、去重、连通性测试等阶段都读取这些字段，不再重复扫描原始行。
+"""
+import re
+
+from .channel import Channel
+
+# genre 标记 | 带协议的 URL | 裸 ip:port（依行内位置取最先出现者）
+# video:// 等包装协议不在协议列表中，会继续匹配到其中的 http(s) 地址
+TOKEN_PATTERN = re.compile(
+    r'(?P<genre>#genre#)'
+    r'|(?P<url>(?P<scheme>https?|rtsp|rtmp|rtp|udp|mms)://'
+    r'(?P<host>\[[0-9A-Fa-f:.]+\]|[^/\s,:?#]*)(?::(?P<port>\d+))?(?P<path>[^\s,]*))'
+    r'|(?P<bare_host>\d{1,3}(?:\.\d{1,3}){3}):(?P<bare_port>\d+)',
+    re.IGNORECASE,
+)
+
+
+def parse_line(line: str, genre: str = ""):
+    """解析单行，genre 为该行所在区域名"""
+    name = line.split(",", 1)[0].strip()
+    m = TOKEN_PATTERN.search(line)
+    if m is None:
+        return Channel(line, name, genre=genre)
+    if m.group("genre"):
+        return Channel(line, name, genre=name, is_genre=True)
+    if m.group("url"):
+        port = m.group("port")
+        return Channel(line, name, m.group("url"), m.group("scheme").lower(), m.group("host"),
+                       int(port) if port else None, m.group("path"), genre)
+    return Channel(line, name, host=m.group("bare_host"), port=int(m.group("bare_port")), genre=genre)
+
+
+def tokenize(lines, genre: str = ""):
+    """逐行解析，自动跟踪当前所在区域"""
+    for line in lines:
+        record = parse_line(line, genre)
+        if record.is_genre:
+            genre = record.genre
+        yield record
@@ -0,0 +1,229 @@
+"""
+跨输出文件的全局 URL 索引
+
+各脚本只在本次运行内按 URL 去重，同一个流地址会同时出现在 my.txt、my1.txt、
+rihou.txt、jqcy.txt 等多个文件中。这里在磁盘上保存一张紧凑的表：
+规范化 URL 的 64 位哈希（tvkit.canonical.url_key）→ 当前拥有它的输出文件。
+
+- 输出文件按 OWNER_PRIORITY 排列优先级，靠前者拥有重复的 URL；
+  优先级较低的文件在处理时删除已被更高优先级文件拥有的 URL
+- 每个文件写出后用 replace() 整体替换自己拥有的 URL，增量更新索引
+- 手工维护的文件（STATIC_OUTPUTS）内容变化时重新扫描登记
+- upstream_stamp() 汇总更高优先级文件的指纹，拼入输出指纹后，
+  上游未变化但归属变化时不会跳过处理
+
+文件格式（小端）：
+    b"TVUX" | 版本 u8 | 文件数 u16 |
+    每个文件：名称长度 u16、名称、指纹长度 u16、指纹 |
+    条目数 u32 | url_key u64 × n（升序）| 文件序号 u8 × n
+"""
+import array
+import hashlib
+import os
+import struct
+import sys
+import threading
+
+from . import CACHE_DIR
+from .canonical import url_key
+from .tokenizer import tokenize
+
+URL_INDEX_PATH = os.path.join(CACHE_DIR, "urlindex", "urls.bin")
+
+# 输出文件的归属优先级，靠前者优先保留重复 URL
+# 可通过环境变量 TVKIT_URL_OWNERS（逗号分隔）覆盖
+OWNER_PRIORITY = ("my.txt", "my1.txt", "rihou.txt", "jqcy.txt", "zubo.txt")
+
+# 手工维护、不由脚本生成的输出文件
+STATIC_OUTPUTS = ("my.txt",)
+
+# 设置环境变量 TVKIT_URL_INDEX=0 关闭跨文件去重
+URL_INDEX_ENABLED = os.environ.get("TVKIT_URL_INDEX", "1") != "0"
+
+MAGIC = b"TVUX"
+VERSION = 2
+
+
+def owner_priority():
+    """当前生效的归属优先级"""
+    value = os.environ.get("TVKIT_URL_OWNERS")
+    if value:
+        return tuple(name.strip() for name in value.split(",") if name.strip())
+    return OWNER_PRIORITY
+
+
+def file_keys(path: str):
+    """扫描一个播放列表文件，返回其中 http(s) URL 的 url_key 集合"""
+    keys = set()
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for record in tokenize(line.strip() for line in f):
+            if record.scheme in ("http", "https"):
+                keys.add(url_key(record.url))
+    return keys
+
+
+def keys_stamp(keys):
+    """URL 集合的指纹"""
+    digest = hashlib.sha1()
+    for key in sorted(keys):
+        digest.update(key.to_bytes(8, 'little'))
+    return digest.hexdigest()
+
+
+class UrlIndex:
+    def __init__(self, path: str = None, priority=None, enabled: bool = True):
+        self.path = path or URL_INDEX_PATH
+        self.priority = tuple(priority or owner_priority())
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.owners = []    # 文件序号 → 文件名
+        self.stamps = {}    # 文件名 → 指纹
+        self.table = {}     # url_key → 文件序号
+        self.dirty = False
+        if enabled:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        try:
+            if data[:4] != MAGIC or data[4] != VERSION:
+                return
+            (count,) = struct.unpack_from("<H", data, 5)
+            pos = 7
+            owners, stamps = [], {}
+            for _ in range(count):
+                (size,) = struct.unpack_from("<H", data, pos)
+                name = data[pos + 2:pos + 2 + size].decode('utf-8')
+                pos += 2 + size
+                (size,) = struct.unpack_from("<H", data, pos)
+                stamps[name] = data[pos + 2:pos + 2 + size].decode('ascii')
+                pos += 2 + size
+                owners.append(name)
+            (n,) = struct.unpack_from("<I", data, pos)
+            pos += 4
+            keys = array.array('Q')
+            keys.frombytes(data[pos:pos + 8 * n])
+            if sys.byteorder != 'little':
+                keys.byteswap()
+            owner_ids = data[pos + 8 * n:pos + 9 * n]
+            if len(keys) != n or len(owner_ids) != n:
+                return
+        except (IndexError, struct.error, UnicodeDecodeError):
+            return
+        self.owners, self.stamps = owners, stamps
+        self.table = dict(zip(keys, owner_ids))
+
+    def _owner_id(self, owner: str):
+        """文件名对应的序号（调用方持有锁）"""
+        try:
+            return self.owners.index(owner)
+        except ValueError:
+            self.owners.append(owner)
+            return len(self.owners) - 1
+
+    def rank(self, owner: str):
+        """优先级序号，越小越优先；未列出的文件排在最后"""
+        try:
+            return self.priority.index(owner)
+        except ValueError:
+            return len(self.priority)
+
+    def outranked(self, key: int, owner: str):
+        """该 URL 是否已被优先级更高的其他文件拥有"""
+        if not self.enabled:
+            return False
+        current = self.table.get(key)
+        if current is None:
+            return False
+        other = self.owners[current]
+        return other != owner and self.rank(other) < self.rank(owner)
+
+    def upstream_stamp(self, owner: str):
+        """优先级高于 owner 的各文件指纹的汇总；未启用时为空字符串"""
+        if not self.enabled:
+            return ""
+        rank = self.rank(owner)
+        with self.lock:
+            parts = [f"{name}={self.stamps.get(name, '')}" for name in self.priority[:rank]]
+        return hashlib.sha1("\n".join(parts).encode('utf-8')).hexdigest()
+
+    def replace(self, owner: str, keys, stamp: str = None):
+        """用本次写出的 URL 集合整体替换 owner 拥有的条目"""
+        if not self.enabled:
+            return
+        keys = set(keys)
+        rank = self.rank(owner)
+        with self.lock:
+            oid = self._owner_id(owner)
+            if len(self.owners) > 255:
+                raise ValueError("URL 索引最多支持 255 个输出文件")
+            table = self.table
+            for key in [k for k, v in table.items() if v == oid]:
+                del table[key]
+            for key in keys:
+                current = table.get(key)
+                if current is None or self.rank(self.owners[current]) >= rank:
+                    table[key] = oid
+            self.stamps[owner] = stamp or keys_stamp(keys)
+            self.dirty = True
+
+    def refresh_static(self, paths=STATIC_OUTPUTS):
+        """手工维护的文件内容变化时重新登记其 URL"""
+        if not self.enabled:
+            return
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    digest = hashlib.sha1(f.read()).hexdigest()
+            except OSError:
+                continue
+            if self.stamps.get(path) != digest:
+                self.replace(path, file_keys(path), digest)
+
+    def save(self):
+        """写回索引文件（原子替换）"""
+        if not self.enabled or not self.dirty:
+            return
+        with self.lock:
+            items = sorted(self.table.items())
+            keys = array.array('Q', (k for k, _ in items))
+            if sys.byteorder != 'little':
+                keys.byteswap()
+            parts = [MAGIC, struct.pack("<BH", VERSION, len(self.owners))]
+            for name in self.owners:
+                encoded = name.encode('utf-8')
+                stamp = self.stamps.get(name, '').encode('ascii')
+                parts.append(struct.pack("<H", len(encoded)) + encoded)
+                parts.append(struct.pack("<H", len(stamp)) + stamp)
+            parts.append(struct.pack("<I", len(items)))
+            parts.append(keys.tobytes())
+            parts.append(bytes(v for _, v in items))
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(b"".join(parts))
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+    def __len__(self):
+        return len(self.table)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_url_index():
+    """返回进程内共享的 UrlIndex（首次调用时加载并登记手工维护的文件）"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            index = UrlIndex(enabled=URL_INDEX_ENABLED)
+            index.refresh_static()
+            index.save()
+            _shared = index
+    return _shared
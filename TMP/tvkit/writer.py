@@ -0,0 +1,180 @@
+"""
+原子输出写入
+
+客户端直接拉取仓库中的播放列表，原地写入时进程中途退出会留下半截文件。
+AtomicWriter 把内容经大缓冲区流式写入同目录的临时文件，边写边计算哈希；
+关闭时与现有文件比较，内容不同才用 os.replace 原子替换，相同则丢弃临时文件，
+原文件与修改时间都不变。读者任何时刻看到的都是完整的旧文件或新文件。
+
+可同时生成预压缩副本（格式见 tvkit.compress）：在同一遍写入中边写边压缩到临时文件，
+内容变化时与原文件一起替换；未变化时逐个与磁盘上的副本比较，
+缺失、过期或损坏（与新副本字节不同）的副本才替换。
+"""
+import hashlib
+import os
+import sys
+import threading
+
+from .compress import COMPRESS_EXTENSIONS, open_compressor
+
+# 写缓冲区大小
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# 比较现有文件时的读取块大小
+READ_CHUNK_SIZE = 1024 * 1024
+
+def file_digest(path: str):
+    """文件内容的 SHA-1，文件不存在时返回 None"""
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def same_content(path_a: str, path_b: str):
+    """两个文件内容相同（任一不存在时为 False）：大小不同直接判定为不同，否则比较哈希"""
+    try:
+        if os.path.getsize(path_a) != os.path.getsize(path_b):
+            return False
+    except OSError:
+        return False
+    return file_digest(path_a) == file_digest(path_b)
+
+
+class _CompressedSibling:
+    """边写边压缩到临时文件的压缩副本；小块写入先攒到 WRITE_CHUNK_SIZE 再交给压缩器"""
+
+    WRITE_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, fmt: str, path: str, tmp_path: str):
+        self.path = path
+        self.tmp_path = tmp_path
+        self._raw = open(tmp_path, 'wb')
+        self._stream = open_compressor(fmt, self._raw)
+        self._pending = []
+        self._pending_size = 0
+
+    def write(self, data: bytes):
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= self.WRITE_CHUNK_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._stream.write(b"".join(self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+    def close(self, complete: bool = True):
+        try:
+            if complete:
+                self._flush()
+            self._stream.close()
+            if complete:
+                self._raw.flush()
+                os.fsync(self._raw.fileno())
+        finally:
+            self._raw.close()
+
+
+class AtomicWriter:
+    """
+    用法：
+        with AtomicWriter("zubo.txt", compress=COMPRESS_FORMATS) as out:
+            out.write("组播,#genre#")
+        out.changed  # 文件内容是否有变化（是否发生替换）
+    compress 为压缩副本格式（默认不生成），内容未变化时仍会修复与新内容不符的副本。
+    异常退出时丢弃临时文件，原文件与副本保持不变
+    """
+
+    def __init__(self, path: str, encoding: str = 'utf-8', buffer_size: int = WRITE_BUFFER_SIZE,
+                 compress=()):
+        self.path = path
+        self.encoding = encoding
+        self.buffer_size = buffer_size
+        self.compress = tuple(compress)
+        self.tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.digest = hashlib.sha1()
+        self.size = 0
+        self.changed = False
+        self._file = None
+        self._siblings = []
+
+    def __enter__(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 以 0o666 创建，受 umask 约束，与普通 open() 创建的文件权限一致
+        fd = os.open(self.tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        self._file = os.fdopen(fd, 'wb', buffering=self.buffer_size)
+        try:
+            for fmt in self.compress:
+                path = self.path + COMPRESS_EXTENSIONS[fmt]
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                self._siblings.append(_CompressedSibling(fmt, path, tmp_path))
+        except BaseException:
+            self.__exit__(*sys.exc_info())
+            raise
+        return self
+
+    def write(self, text: str):
+        data = text.encode(self.encoding)
+        self.digest.update(data)
+        self.size += len(data)
+        self._file.write(data)
+        for sibling in self._siblings:
+            sibling.write(data)
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+    def _unchanged(self):
+        """现有文件与新内容相同：大小不同直接判定为变化，否则比较哈希"""
+        try:
+            if os.path.getsize(self.path) != self.size:
+                return False
+        except OSError:
+            return False
+        return file_digest(self.path) == self.hexdigest()
+
+    def __exit__(self, exc_type, exc, tb):
+        complete = exc_type is None
+        try:
+            try:
+                self._file.flush()
+                if complete:
+                    os.fsync(self._file.fileno())
+            finally:
+                self._file.close()
+                for sibling in self._siblings:
+                    sibling.close(complete)
+            if complete and not self._unchanged():
+                # 副本先于原文件替换，客户端看到新文件时副本已是同一内容
+                for sibling in self._siblings:
+                    os.replace(sibling.tmp_path, sibling.path)
+                os.replace(self.tmp_path, self.path)
+                self.changed = True
+            elif complete:
+                # 内容未变化：与磁盘上相同的副本保持不动，缺失、过期或损坏的副本替换为新副本
+                for sibling in self._siblings:
+                    if not same_content(sibling.tmp_path, sibling.path):
+                        os.replace(sibling.tmp_path, sibling.path)
+        finally:
+            if not self.changed and os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+            for sibling in self._siblings:
+                if os.path.exists(sibling.tmp_path):
+                    os.remove(sibling.tmp_path)
+        return False
+
+
+def write_text(path: str, text: str, encoding: str = 'utf-8', compress=()):
+    """原子写入整段文本，返回文件内容是否有变化；compress 为压缩副本格式"""
+    with AtomicWriter(path, encoding, compress=compress) as out:
+        out.write(text)
+    return out.changed
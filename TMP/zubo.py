@@ -1,10 +1,22 @@
 #!/usr/bin/env python3
-import re
 import os
 import sys
-import socket
-import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
+
+from tvkit.channel import ChannelTable
+from tvkit.fetch import fetch_all, MAX_FETCH_WORKERS
+from tvkit.health import HealthStore
+from tvkit.liveness import StreamChecker, stream_check_from_env
+from tvkit.metrics import Metrics, run_processor
+from tvkit.http import get_session
+from tvkit.httpcache import get_cache
+from tvkit.pipeline import (fetch_source, chain_sources, close_sources, exclude_sections,
+                            drop_genre_lines, filter_keywords, dedup_by_url, drop_owned,
+                            collect_urls, filter_alive, keyword_hits, write_lines)
+from tvkit.probe import (CONNECT_TIMEOUT, PER_HOST_LIMIT, PROBE_CONCURRENCY, PROBE_DEADLINE,
+                         probe_endpoints)
+from tvkit.rank import best_n_from_env, rank_mirrors
+from tvkit.urlindex import get_url_index
 
 # 全局排除关键词定义（用于分类排除）
 EXCLUDE_KEYWORDS = ["移动"]
@@ -12,180 +24,144 @@ EXCLUDE_KEYWORDS = ["移动"]
 # 行内容过滤关键词
 CONTENT_FILTER_KEYWORDS = ["CCTV", "CG", "卫视","144.255.31.236"]
 
-# 网络连接测试超时（秒）
-CONNECT_TIMEOUT = 3
+# 请求头
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
 
-# 连接测试并发数
-MAX_WORKERS = 50
+# 流级别存活检测（TVKIT_STREAM_CHECK=1 开启）与每个频道保留的最快镜像数（TVKIT_BEST_N）
+STREAM_CHECK = stream_check_from_env()
+BEST_N = best_n_from_env()
 
 
 class TVSourceProcessor:
-    def __init__(self):
-        self.all_lines = []
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        self.connect_cache = {}
+    def __init__(self, max_workers: int = MAX_FETCH_WORKERS):
+        self.bodies = []
+        self.stats = Counter()
+        self.max_workers = max_workers
+        self.session = get_session()
+        self.health = HealthStore()
+        # 以端点 id 为下标的 TCP 连接耗时
+        self.endpoint_latencies = []
+        self.cache = get_cache()
+        self.url_index = get_url_index()
+        self.metrics = Metrics("zubo")
+
+    def close(self):
+        """关闭健康记录库"""
+        self.health.close()
 
     def fetch_url_content(self, url: str):
-        """使用 requests 获取URL内容"""
+        """使用 requests 流式获取URL内容"""
         try:
             print(f"获取: {url}")
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            response.encoding = response.apparent_encoding
-            content = response.text
-            lines = [line.strip() for line in content.splitlines() if line.strip()]
-            print(f"  成功: {len(lines)} 行")
-            return lines
+            body = fetch_source(self.session, url, self.cache, metrics=self.metrics, headers=HEADERS, timeout=30)
+            if body.from_cache:
+                print(f"  未变化(304)，使用缓存 <- {url}")
+            print(f"  成功: {body.size} 字节 ({body.encoding}) <- {url}")
+            return body
         except Exception as e:
-            print(f"  失败: {e}")
-            return []
+            print(f"  失败: {e} <- {url}")
+            return None
 
     def fetch_multiple_urls(self, urls: list):
-        """获取多个URL内容"""
-        self.all_lines = []
-        for url in urls:
-            lines = self.fetch_url_content(url)
-            if lines:
-                self.all_lines.extend(lines)
-        print(f"总计: {len(self.all_lines)} 行")
-        return len(self.all_lines) > 0
-
-    def remove_excluded_sections(self):
-        """排除指定区域"""
-        if not self.all_lines:
-            return []
-        result = []
-        in_excluded_section = False
-        for line in self.all_lines:
-            if "#genre#" in line:
-                if any(keyword in line for keyword in EXCLUDE_KEYWORDS):
-                    in_excluded_section = True
-                else:
-                    in_excluded_section = False
-                result.append(line)
-            elif not in_excluded_section:
-                result.append(line)
-        print(f"排除后: {len(result)} 行")
-        return result
-
-    def remove_genre_lines_and_deduplicate(self, lines: list):
-        """删除genre行，按URL去重，并过滤内容关键词"""
-        result = []
-        seen_urls = set()
-        filtered_count = 0
-        for line in lines:
-            if "#genre#" in line:
-                continue
-            if not line.strip():
-                continue
-            line_lower = line.lower()
-            if any(keyword.lower() in line_lower for keyword in CONTENT_FILTER_KEYWORDS):
-                filtered_count += 1
-                continue
-            url_match = re.search(r'(https?://[^\s,]+)', line)
-            if url_match:
-                url = url_match.group(1)
-                if url not in seen_urls:
-                    seen_urls.add(url)
-                    result.append(line)
-            else:
-                result.append(line)
-        print(f"内容过滤: {filtered_count} 行被过滤")
-        print(f"去重后: {len(result)} 行")
-        return result
+        """并发获取多个URL内容，按源顺序排列"""
+        self.bodies = fetch_all(self.fetch_url_content, urls, self.max_workers)
+        ok = [body for body in self.bodies if body is not None]
+        print(f"总计: {len(ok)} 个源, {sum(body.size for body in ok)} 字节")
+        return len(ok) > 0
 
-    def _test_single_connection(self, host: str, port: int):
-        """测试单个 ip:port 的TCP连通性"""
-        key = f"{host}:{port}"
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(CONNECT_TIMEOUT)
-            result = sock.connect_ex((host, port))
-            sock.close()
-            return key, (result == 0)
-        except Exception:
-            return key, False
-
-    def test_connections(self, lines: list):
-        """对所有行的ip:port进行连通性测试，相同ip:port只测一次"""
-        ip_port_map = {}
-        line_to_ipport = {}
-
-        # 支持 http/rtp/rtsp/rtmp 中的 ip:port，以及裸 ip:port
-        pattern_url = re.compile(r'(?:https?|rtp|rtsp|rtmp)://(\d+\.\d+\.\d+\.\d+):(\d+)')
-        pattern_raw = re.compile(r'(\d+\.\d+\.\d+\.\d+):(\d+)')
-
-        for i, line in enumerate(lines):
-            m = pattern_url.search(line)
-            if not m:
-                m = pattern_raw.search(line)
-            if m:
-                ip, port = m.group(1), int(m.group(2))
-                key = f"{ip}:{port}"
-                ip_port_map[key] = None
-                line_to_ipport[i] = key
-
-        if not ip_port_map:
+    def remove_excluded_sections(self, lines):
+        """排除指定区域"""
+        return exclude_sections(lines, EXCLUDE_KEYWORDS, self.stats)
+
+    def remove_genre_lines_and_deduplicate(self, lines):
+        """删除genre行，按URL去重（含已归属其他输出文件的URL），并过滤内容关键词"""
+        lines = filter_keywords(drop_genre_lines(lines), CONTENT_FILTER_KEYWORDS, self.stats)
+        lines = dedup_by_url(lines, stats=self.stats)
+        return drop_owned(lines, self.url_index, "zubo.txt", self.stats)
+
+    def test_connections(self, table: ChannelTable):
+        """
+        对频道表中的 主机:端口 端点进行连通性测试，相同端点只测一次，返回保留的频道列表
+        域名端点（TVKIT_PROBE_HOSTNAMES=1 时）先解析，解析失败与连接失败分别计数
+        """
+        unique_count = len(table.endpoints)
+        if not unique_count:
             print("未发现任何IP:端口，跳过连接测试")
-            return lines
-
-        unique_count = len(ip_port_map)
-        print(f"\n连接测试: 发现 {unique_count} 个唯一 ip:port，并发 {MAX_WORKERS}，超时 {CONNECT_TIMEOUT}s")
-
-        success_count = 0
-        fail_count = 0
-        done_count = 0
-
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = {}
-            for key in ip_port_map:
-                parts = key.split(":")
-                host, port = parts[0], int(parts[1])
-                futures[executor.submit(self._test_single_connection, host, port)] = key
-
-            for future in as_completed(futures):
-                key, is_ok = future.result()
-                ip_port_map[key] = is_ok
-                done_count += 1
-                if is_ok:
-                    success_count += 1
-                else:
-                    fail_count += 1
-                if done_count % 50 == 0 or done_count == unique_count:
-                    print(f"  进度: {done_count}/{unique_count}  成功:{success_count}  失败:{fail_count}")
-
-        print(f"连接测试完成: 成功 {success_count}, 失败 {fail_count}")
-
-        # 过滤掉连接失败的行
-        result = []
-        dropped = 0
-        for i, line in enumerate(lines):
-            key = line_to_ipport.get(i)
-            if key is None:
-                result.append(line)
-            elif ip_port_map.get(key, False):
-                result.append(line)
-            else:
-                dropped += 1
-
-        print(f"连通性过滤: {dropped} 行被移除，保留 {len(result)} 行")
+            return list(table)
+
+        print(f"\n连接测试: 发现 {unique_count} 个唯一 主机:端口，并发 {PROBE_CONCURRENCY}"
+              f"（单主机 {PER_HOST_LIMIT}），超时 {CONNECT_TIMEOUT}s，截止 {PROBE_DEADLINE}s")
+
+        # 有效期内的历史结果直接复用，只测试过期或新出现的端点
+        keys = [f"{host}:{port}" for host, port in table.endpoints]
+        fresh = self.health.lookup(keys)
+        due = [eid for eid, key in enumerate(keys) if key not in fresh]
+        print(f"  健康记录命中: {unique_count - len(due)}，需要测试: {len(due)}")
+        self.metrics.count("cache_hits", unique_count - len(due), kind="health")
+
+        counts = Counter()
+        total_due = len(due)
+
+        def progress(i, latency):
+            counts["done"] += 1
+            counts["success" if latency is not None else "fail"] += 1
+            if counts["done"] % 500 == 0:
+                print(f"  进度: {counts['done']}/{total_due}  成功:{counts['success']}  失败:{counts['fail']}")
+
+        endpoints = [table.endpoints[eid] for eid in due]
+        probed, cancelled, unresolved = probe_endpoints(endpoints, CONNECT_TIMEOUT, PROBE_CONCURRENCY,
+                                                        PER_HOST_LIMIT, PROBE_DEADLINE, progress)
+        for i, latency in enumerate(probed):
+            if latency is not None:
+                self.metrics.count("probe_total", result="success")
+                self.metrics.observe("probe_latency_seconds", latency)
+            elif i in unresolved:
+                self.metrics.count("probe_total", result="unresolved")
+            elif i not in cancelled:
+                self.metrics.count("probe_total", result="fail")
+        # 到截止时间仍未测试的端点不写入健康记录，不累计连续失败次数，下次运行重新测试
+        self.health.record({keys[eid]: latency for i, (eid, latency) in enumerate(zip(due, probed))
+                            if i not in cancelled})
+        if cancelled:
+            print(f"  截止时间内未测试: {len(cancelled)} 个端点（本次按失败处理，不计入健康记录）")
+
+        # 以端点 id 为下标的连接耗时，None 表示失败
+        latencies = [fresh.get(key) for key in keys]
+        for eid, latency in zip(due, probed):
+            latencies[eid] = latency
+        self.endpoint_latencies = latencies
+        success_count = sum(1 for latency in latencies if latency is not None)
+        unresolved_note = f"（其中域名解析失败 {len(unresolved)}）" if unresolved else ""
+        print(f"连接测试完成: 成功 {success_count}, 失败 {unique_count - success_count}{unresolved_note}")
+
+        # 过滤掉连接失败的频道；域名解析失败的行单独计数
+        unresolved_eids = {due[i] for i in unresolved}
+        self.stats["unresolved"] += sum(1 for eid in table.channel_endpoints if eid in unresolved_eids)
+        result, dropped = table.filter_endpoints([latency is not None for latency in latencies])
+        unresolved_note = f"（其中域名解析失败 {self.stats['unresolved']} 行）" if unresolved else ""
+        print(f"连通性过滤: {dropped} 行被移除{unresolved_note}，保留 {len(result)} 行")
         return result
 
-    def save_to_file(self, lines: list, filename: str, first_line: str):
-        """保存到文件"""
+    def connect_latency(self, table: ChannelTable, record):
+        """频道端点的 TCP 连接耗时，没有端点或未测得时返回 None"""
+        endpoint = record.endpoint
+        if endpoint is None or not self.endpoint_latencies:
+            return None
+        return self.endpoint_latencies[table.endpoint_ids[endpoint]]
+
+    def save_to_file(self, lines, filename: str, first_line: str):
+        """流式保存到文件，返回写入的行数，失败返回 -1"""
         try:
-            content = [first_line] + lines
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(content))
-            file_size = os.path.getsize(filename)
-            print(f"保存: {filename} ({len(content)}行, {file_size}字节)")
-            return True
+            count = write_lines(filename, lines, first_line)
+            if count:
+                file_size = os.path.getsize(filename)
+                print(f"保存: {filename} ({count + 1}行, {file_size}字节)")
+            return count
         except Exception as e:
             print(f"保存失败: {e}")
-            return False
+            return -1
 
     def process(self):
         """主处理流程"""
@@ -198,35 +174,72 @@ class TVSourceProcessor:
         ]
         print(f"源URL: {len(urls)}个")
 
-        if not self.fetch_multiple_urls(urls):
+        with self.metrics.stage("fetch"):
+            fetched = self.fetch_multiple_urls(urls)
+        self.cache.save()
+        if not fetched:
             print("无内容可处理")
             return False
 
-        filtered = self.remove_excluded_sections()
-        if not filtered:
-            print("排除后无内容")
-            return False
-
-        final = self.remove_genre_lines_and_deduplicate(filtered)
-        if not final:
+        # 连通性随时间变化：上游未变化（304）时也重新测试，输出内容相同时 AtomicWriter 不替换文件
+
+        # 连接测试需要两遍扫描，去重后的频道在此收集为频道表
+        track = self.metrics.track
+        with self.metrics.stage("parse"):
+            lines = track("parse", chain_sources(self.bodies))
+            filtered = track("exclude", self.remove_excluded_sections(lines))
+            table = ChannelTable(track("dedup", self.remove_genre_lines_and_deduplicate(filtered)))
+        print(f"排除: {self.stats['excluded_lines']} 行")
+        print(f"内容过滤: {self.stats['filtered']} 行被过滤")
+        if self.stats['filtered']:
+            print(f"  命中关键词: {keyword_hits(self.stats, 'filtered')}")
+        if self.stats['owned_elsewhere']:
+            print(f"已归属其他文件: {self.stats['owned_elsewhere']} 行")
+        print(f"去重后: {len(table)} 行")
+        if not table:
             print("去重后无内容")
             return False
 
-        final = self.test_connections(final)
+        with self.metrics.stage("probe"):
+            final = self.test_connections(table)
+        self.metrics.count_lines("probe", len(table), len(final))
+
+        checker = None
+        if STREAM_CHECK and final:
+            checker = StreamChecker()
+            with self.metrics.stage("stream_check"):
+                final = list(track("stream_check", filter_alive(final, checker, self.stats)))
+            checker.close()
+            print(f"流检测: 存活 {self.stats[('stream', 'alive')]}, 重定向 {self.stats[('stream', 'redirect')]}, "
+                  f"失效 {self.stats[('stream', 'dead')]}")
+
+        if BEST_N > 0 and final:
+            if checker is not None:
+                latency_of = lambda record: checker.latency(record.url)
+            else:
+                latency_of = lambda record: self.connect_latency(table, record)
+            with self.metrics.stage("rank"):
+                final = list(track("rank", rank_mirrors(final, latency_of, BEST_N, self.stats)))
+            print(f"镜像排序: 每个频道保留 {BEST_N} 个，移除 {self.stats['ranked_out']} 行")
 
         if not final:
             print("连通性过滤后无内容")
             return False
 
-        if self.save_to_file(final, "zubo.txt", "组播,#genre#"):
+        written_urls = set()
+        with self.metrics.stage("write"):
+            count = self.save_to_file(collect_urls(final, written_urls), "zubo.txt", "组播,#genre#")
+        if count > 0:
+            self.url_index.replace("zubo.txt", written_urls)
+            self.url_index.save()
+            self.cache.save()
             print("处理完成")
             return True
         return False
 
 
 def main():
-    processor = TVSourceProcessor()
-    success = processor.process()
+    success = run_processor(TVSourceProcessor())
     if success and os.path.exists("zubo.txt"):
         print(f"文件位置: {os.path.abspath('zubo.txt')}")
         sys.exit(0)
@@ -0,0 +1,120 @@
+"""
+确定性的播放列表语料生成
+
+同样的 (行数, seed) 总是生成逐字节相同的文件，不同提交之间的基准结果可直接比较。
+语料刻意包含各处理阶段需要处理的情况：
+- 含排除关键词的 genre 段（体育、音乐……）与含过滤关键词的行
+- 重复的 URL，以及只在默认端口、参数顺序上不同的写法
+- 组播转发形式的 ip:port 地址（主机都在 127.0.0.0/8 内，连通性测试不会打到外网）
+- video:// 包装地址
+"""
+import random
+
+DEFAULT_SEED = 20240501
+
+CHANNEL_NAMES = (
+    ["CCTV%d" % i for i in range(1, 18)]
+    + ["CCTV5+体育赛事", "CCTV4中文国际", "CGTN"]
+    + [p + "卫视" for p in ("湖南", "浙江", "江苏", "东方", "北京", "广东", "深圳", "山东", "安徽", "天津",
+                             "湖北", "河南", "四川", "重庆", "江西", "辽宁", "黑龙江", "吉林", "广西", "云南")]
+    + ["凤凰中文", "凤凰资讯", "翡翠台", "明珠台", "TVB星河", "东森新闻", "中天新闻", "民视", "华视", "八大综合"]
+)
+
+GENRES = ["央视频道", "卫视频道", "地方频道", "港澳台", "电影轮播", "体育频道", "音乐MV", "少儿动画",
+          "新闻资讯", "纪录片", "测试线路", "戏曲", "综艺", "直播中国"]
+
+# 混入名称中的词，命中各脚本的内容过滤关键词
+NAME_NOISE = ["", "", "", "", "", " 高清", " 4K", " 备用", "更新", "DJ", "购买", "盗源", "huya", "(内)"]
+
+# 重复 URL 的比例
+DUPLICATE_RATE = 0.2
+
+# genre 段的平均长度（行）
+SECTION_LENGTH = 60
+
+# 不同组播转发端点的数量（连通性测试的规模与语料行数无关）
+ENDPOINT_POOL = 4000
+
+
+class _Generator:
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.urls = []
+        self.endpoints = [
+            (f"127.{self.rng.randrange(1, 255)}.{self.rng.randrange(0, 255)}.{self.rng.randrange(1, 255)}",
+             self.rng.randrange(1024, 65535))
+            for _ in range(ENDPOINT_POOL)
+        ]
+
+    def name(self):
+        rng = self.rng
+        return rng.choice(CHANNEL_NAMES) + rng.choice(NAME_NOISE)
+
+    def fresh_url(self):
+        rng = self.rng
+        kind = rng.random()
+        if kind < 0.35:
+            host, port = rng.choice(self.endpoints)
+            return f"http://{host}:{port}/rtp/239.{rng.randrange(0, 255)}.{rng.randrange(0, 255)}." \
+                   f"{rng.randrange(1, 255)}:{rng.choice((5000, 5140, 8000))}"
+        if kind < 0.75:
+            cdn = rng.randrange(1, 40)
+            return f"https://cdn{cdn}.live-example.com/live/{rng.getrandbits(40):x}/index.m3u8" \
+                   f"?auth={rng.getrandbits(32):08x}&ts={rng.randrange(10 ** 9, 2 * 10 ** 9)}"
+        if kind < 0.95:
+            return f"http://tv{rng.randrange(1, 200)}.stream-example.net:{rng.choice((80, 8080, 9901))}" \
+                   f"/hls/{rng.randrange(1, 99999)}/playlist.m3u8"
+        return f"video://https://www.douyu.com/{rng.randrange(100000, 9999999)}"
+
+    def url(self):
+        """新 URL，或以 DUPLICATE_RATE 的概率重复已有 URL（可能换一种等价写法）"""
+        rng = self.rng
+        if self.urls and rng.random() < DUPLICATE_RATE:
+            url = rng.choice(self.urls)
+            if url.startswith("https://") and "?" in url and rng.random() < 0.5:
+                base, query = url.split("?", 1)
+                url = base.replace(".com/", ".com:443/", 1) + "?" + "&".join(reversed(query.split("&")))
+            return url
+        url = self.fresh_url()
+        if len(self.urls) < 200000:
+            self.urls.append(url)
+        return url
+
+    def genre(self):
+        return self.rng.choice(GENRES)
+
+
+def generate_txt(path: str, lines: int, seed: int = DEFAULT_SEED):
+    """生成 txt 播放列表（“名称,URL” 行与 “段名,#genre#” 行），返回写入的行数"""
+    gen = _Generator(seed)
+    rng = gen.rng
+    written = 0
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        while written < lines:
+            f.write(f"{gen.genre()},#genre#\n")
+            written += 1
+            for _ in range(min(lines - written, rng.randrange(SECTION_LENGTH // 2, SECTION_LENGTH * 3 // 2))):
+                f.write(f"{gen.name()},{gen.url()}\n")
+                written += 1
+    return written
+
+
+def generate_m3u(path: str, lines: int, seed: int = DEFAULT_SEED):
+    """生成扩展 M3U（#EXTINF 与 URL 成对出现，带 tvg-name、group-title），返回写入的行数"""
+    gen = _Generator(seed)
+    rng = gen.rng
+    written = 1
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write('#EXTM3U x-tvg-url="https://epg.example.com/e.xml"\n')
+        while written + 1 < lines:
+            group = gen.genre()
+            for _ in range(rng.randrange(SECTION_LENGTH // 2, SECTION_LENGTH * 3 // 2)):
+                if written + 1 >= lines:
+                    break
+                name = gen.name()
+                f.write(f'#EXTINF:-1 tvg-id="{name}" tvg-name="{name}" '
+                        f'tvg-logo="https://logo.example.com/{rng.randrange(1, 500)}.png" '
+                        f'group-title="{group}",{name}\n')
+                f.write(f"{gen.url()}\n")
+                written += 2
+    return written
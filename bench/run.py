@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+播放列表处理基准测试
+
+用法：
+    python bench/run.py                        # 默认规模 1k,10k,100k，全部测试
+    python bench/run.py --sizes 1k,1m,5m       # 指定规模（行数，支持 k/m 后缀）
+    python bench/run.py --suites stages,m3u    # 只运行部分测试
+    python bench/run.py --no-save              # 只打印，不写入结果文件
+
+测试：
+    stages      tvkit 管道各阶段：获取、解码、解析、排除区域、关键词过滤、去重、连通性测试、写文件
+    processors  main.py、my1、rihou、zubo 的 TVSourceProcessor 端到端，各自在独立子进程和临时目录中运行；
+                总耗时之外，另起一个开启 tvkit.metrics 的子进程得到各阶段的独占耗时
+    m3u         my2.parse_m3u_with_groups（my2 依赖 cloudscraper，导入失败时打印提示并跳过）
+
+语料由 bench/corpus.py 按固定 seed 生成并缓存在 .cache/bench 下，由本地替身服务器
+（bench/server.py）提供。管道各阶段按“前 k 个阶段”累计计时，相邻两次之差即该阶段的耗时，
+全程流式处理，5M 行规模也不会把整份语料读入内存。
+
+结果追加到 bench/results.jsonl（每行一条，带提交号）。运行结束时与其他提交最近一次的
+同项结果比较，耗时增加超过 REGRESSION_RATIO 的项标记为回退。
+处理器运行失败（process() 未返回成功，如 zubo 的语料端点全部不可达而没有写出文件）的项
+标记为失败，其计时不代表完整流程，也不作为基线。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+TMP_DIR = os.path.join(ROOT_DIR, "TMP")
+sys.path.insert(0, TMP_DIR)
+
+# 跨文件 URL 索引会让各次运行互相影响结果，基准测试中关闭
+os.environ.setdefault("TVKIT_URL_INDEX", "0")
+# 开启指标输出时流式阶段逐行计时，会改变被测耗时
+os.environ.pop("TVKIT_METRICS", None)
+# 预压缩副本会把压缩耗时计入写入阶段，与历史基线不可比，默认关闭
+os.environ.setdefault("TVKIT_COMPRESS", "")
+
+import requests  # noqa: E402
+
+from corpus import generate_m3u, generate_txt  # noqa: E402
+from server import StaticRedirectAdapter, serve  # noqa: E402
+
+CORPUS_DIR = os.path.join(ROOT_DIR, ".cache", "bench")
+RESULTS_FILE = os.path.join(BENCH_DIR, "results.jsonl")
+
+DEFAULT_SIZES = "1k,10k,100k"
+SUITES = ("stages", "processors", "m3u")
+
+# 参与端到端测试的处理器：名称 → 模块名（main 位于仓库根目录，其余位于 TMP）
+PROCESSORS = {"main": "main", "my1": "my1", "rihou": "rihou", "zubo": "zubo"}
+
+# 耗时超过基线的该倍数（且绝对差超过 REGRESSION_MIN_SECONDS）时标记为回退
+REGRESSION_RATIO = 1.2
+REGRESSION_MIN_SECONDS = 0.005
+
+# 连通性测试参数（语料中的端点都在 127.0.0.0/8，连接会被立即拒绝）
+PROBE_TIMEOUT = 1
+PROBE_DEADLINE = 30
+
+
+def parse_size(text: str):
+    """'10k' → 10000，'5m' → 5000000"""
+    text = text.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def corpus_path(kind: str, lines: int):
+    """返回语料文件路径，不存在时生成"""
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    name = f"{kind}-{lines}.{'m3u' if kind == 'm3u' else 'txt'}"
+    path = os.path.join(CORPUS_DIR, name)
+    if not os.path.exists(path):
+        print(f"生成语料: {name}")
+        tmp_path = path + ".tmp"
+        (generate_m3u if kind == "m3u" else generate_txt)(tmp_path, lines)
+        os.replace(tmp_path, path)
+    return path
+
+
+def timed(fn, repeat: int = 1):
+    """运行 repeat 次，返回最快一次的 (墙钟秒, CPU 秒, 返回值)"""
+    best = None
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = fn()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        if best is None or wall < best[0]:
+            best = (wall, cpu, result)
+    return best
+
+
+def consume(records):
+    """消费生成器，返回产出的条数"""
+    counter = deque(enumerate(records, 1), maxlen=1)
+    return counter[0][0] if counter else 0
+
+
+def bench_stages(lines: int, repeat: int):
+    """tvkit 管道各阶段"""
+    import rihou
+    from tvkit.pipeline import (SourceBody, dedup_by_url, drop_genre_lines, exclude_sections,
+                                fetch_source, filter_keywords, write_lines)
+    from tvkit.probe import probe_endpoints
+    from tvkit.tokenizer import tokenize
+
+    results = []
+    path = corpus_path("txt", lines)
+    workdir = tempfile.mkdtemp(prefix="tvkit-bench-")
+    try:
+        with serve(CORPUS_DIR) as base:
+            url = f"{base}/{os.path.basename(path)}"
+            session = requests.Session()
+
+            def fetch():
+                return fetch_source(session, url)
+
+            wall, cpu, body = timed(fetch)
+            size, encoding = body.size, body.encoding
+            spooled = os.path.join(workdir, "source.txt")
+            body.fileobj.seek(0)
+            with open(spooled, 'wb') as f:
+                shutil.copyfileobj(body.fileobj, f)
+            body.close()
+            results.append({"stage": "fetch", "wall": wall, "cpu": cpu, "lines": lines, "bytes": size})
+
+        def source_lines():
+            return SourceBody(url, open(spooled, 'rb'), size, encoding).iter_lines()
+
+        # 累计管道：每一项在前一项基础上多接一个阶段
+        pipelines = [
+            ("decode", source_lines),
+            ("tokenize", lambda: tokenize(source_lines())),
+            ("exclude", lambda: exclude_sections(tokenize(source_lines()), rihou.EXCLUDE_KEYWORDS)),
+            ("filter", lambda: filter_keywords(drop_genre_lines(
+                exclude_sections(tokenize(source_lines()), rihou.EXCLUDE_KEYWORDS)),
+                rihou.CONTENT_FILTER_KEYWORDS)),
+            ("dedup", lambda: dedup_by_url(filter_keywords(drop_genre_lines(
+                exclude_sections(tokenize(source_lines()), rihou.EXCLUDE_KEYWORDS)),
+                rihou.CONTENT_FILTER_KEYWORDS))),
+        ]
+        previous = (0.0, 0.0)
+        final = None
+        for stage, make in pipelines:
+            wall, cpu, count = timed(lambda: consume(make()), repeat)
+            results.append({"stage": stage, "wall": max(wall - previous[0], 0.0),
+                            "cpu": max(cpu - previous[1], 0.0), "lines": count})
+            previous = (wall, cpu)
+            final = make
+
+        out_path = os.path.join(workdir, "out.txt")
+
+        def write():
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            return write_lines(out_path, final(), "bench,#genre#")
+
+        wall, cpu, count = timed(write, repeat)
+        results.append({"stage": "write", "wall": max(wall - previous[0], 0.0),
+                        "cpu": max(cpu - previous[1], 0.0), "lines": count})
+
+        endpoints = sorted({r.endpoint for r in tokenize(source_lines()) if r.endpoint})
+        wall, cpu, (latencies, _, _) = timed(lambda: probe_endpoints(endpoints, timeout=PROBE_TIMEOUT,
+                                                                  deadline=PROBE_DEADLINE))
+        results.append({"stage": "probe", "wall": wall, "cpu": cpu, "lines": len(endpoints),
+                        "reachable": sum(1 for latency in latencies if latency is not None)})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def processor_stages(metrics):
+    """
+    处理器各阶段的独占墙钟秒：track() 流式阶段与 stage() 阶段（扣除其中消费的流式阶段）
+    两者同名时（如 zubo 的 parse）相加
+    """
+    stages = dict(metrics.stream_seconds)
+    for name, seconds in metrics.stage_self_seconds.items():
+        stages[name] = stages.get(name, 0.0) + seconds
+    return stages
+
+
+def run_processor_child(name: str, target: str, with_stages: bool = False):
+    """
+    子进程入口：把共享会话的所有请求指向 target，运行一次处理器，最后一行输出 JSON 计时
+    with_stages 时开启指标记录并附带各阶段耗时（逐行计时有开销，总耗时不与无指标的运行比较）
+    """
+    sys.path.insert(0, ROOT_DIR)
+    module = __import__(PROCESSORS[name])
+    from tvkit.http import get_session
+
+    adapter = StaticRedirectAdapter(target)
+    session = get_session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    processor = module.TVSourceProcessor()
+    processor.metrics.enabled = with_stages
+    wall, cpu, ok = timed(processor.process)
+    timing = {"wall": wall, "cpu": cpu, "ok": bool(ok)}
+    if with_stages:
+        timing["stages"] = processor_stages(processor.metrics)
+    print(json.dumps(timing))
+
+
+def spawn_processor(name: str, target: str, with_stages: bool = False):
+    """在独立的临时目录与缓存目录中运行处理器子进程，返回其 JSON 计时（失败时返回 None）"""
+    workdir = tempfile.mkdtemp(prefix=f"tvkit-bench-{name}-")
+    env = dict(os.environ, TVKIT_CACHE_DIR=os.path.join(workdir, ".cache"), TVKIT_URL_INDEX="0")
+    command = [sys.executable, os.path.abspath(__file__), "--_processor", name, "--_target", target]
+    if with_stages:
+        command.append("--_stages")
+    try:
+        proc = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    try:
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        print(f"  处理器 {name} 运行失败:\n{proc.stderr[-2000:]}")
+        return None
+
+
+def bench_processors(lines: int):
+    """各 TVSourceProcessor 端到端：总耗时与各阶段独占耗时"""
+    results = []
+    path = corpus_path("txt", lines)
+    with serve(CORPUS_DIR) as base:
+        target = f"{base}/{os.path.basename(path)}"
+        for name in PROCESSORS:
+            timing = spawn_processor(name, target)
+            if timing is None:
+                results.append({"variant": name, "stage": "total", "wall": 0.0, "cpu": 0.0,
+                                "lines": lines, "ok": False})
+                continue
+            results.append({"variant": name, "stage": "total", "wall": timing["wall"], "cpu": timing["cpu"],
+                            "lines": lines, "ok": timing["ok"]})
+            timing = spawn_processor(name, target, with_stages=True)
+            if timing is None:
+                continue
+            for stage, seconds in timing["stages"].items():
+                results.append({"variant": name, "stage": f"stage.{stage}", "wall": seconds, "cpu": None,
+                                "lines": lines, "ok": timing["ok"]})
+    return results
+
+
+def bench_m3u(lines: int, repeat: int):
+    """my2.parse_m3u_with_groups"""
+    try:
+        import my2
+    except (ImportError, SystemExit):
+        print("  my2 依赖 cloudscraper，未安装，跳过 m3u 测试")
+        return []
+    path = corpus_path("m3u", lines)
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    wall, cpu, (groups, channels) = timed(lambda: my2.parse_m3u_with_groups(content), repeat)
+    return [{"stage": "parse_m3u_with_groups", "wall": wall, "cpu": cpu, "lines": lines,
+             "channels": sum(len(v) for v in channels.values())}]
+
+
+def git_commit():
+    """当前提交号，工作区有改动时加 -dirty 后缀"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT_DIR,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def load_results(path: str = RESULTS_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return []
+
+
+def result_key(record: dict):
+    return record["suite"], record.get("variant", ""), record["size"], record["stage"]
+
+
+def report(records, history):
+    """打印本次结果，并与其他提交最近一次的同项成功结果比较；返回 (回退项数, 失败项数)"""
+    baseline = {}
+    current = records[0]["commit"] if records else None
+    for record in history:
+        if record.get("commit") != current and record.get("ok", True):
+            baseline[result_key(record)] = record
+
+    regressions = failures = 0
+    print(f"\n{'测试':<10} {'项目':<28} {'规模':>8} {'行数':>9} {'墙钟ms':>10} {'CPUms':>10} {'基线ms':>10} {'比值':>6}")
+    for record in records:
+        suite, variant, size, stage = result_key(record)
+        label = f"{variant}.{stage}" if variant else stage
+        base = baseline.get(result_key(record))
+        ratio = ""
+        flag = ""
+        if not record.get("ok", True):
+            if stage == "total":
+                flag = "  ✗ 失败"
+                failures += 1
+            base = None
+        if base and base["wall"] > 0:
+            ratio = f"{record['wall'] / base['wall']:.2f}"
+            if (record["wall"] > base["wall"] * REGRESSION_RATIO
+                    and record["wall"] - base["wall"] > REGRESSION_MIN_SECONDS):
+                flag = f"  ⚠ 回退（基线 {base['commit']}）"
+                regressions += 1
+        base_ms = f"{base['wall'] * 1000:.1f}" if base else "-"
+        cpu_ms = f"{record['cpu'] * 1000:.1f}" if record.get("cpu") is not None else "-"
+        print(f"{suite:<10} {label:<28} {size:>8} {record.get('lines', 0):>9} "
+              f"{record['wall'] * 1000:>10.1f} {cpu_ms:>10} {base_ms:>10} {ratio:>6}{flag}")
+    return regressions, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='播放列表处理基准测试')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'语料行数，逗号分隔（默认 {DEFAULT_SIZES}）')
+    parser.add_argument('--suites', default=",".join(SUITES), help=f'测试集，逗号分隔（{", ".join(SUITES)}）')
+    parser.add_argument('--repeat', type=int, default=3, help='10 万行以内的规模每项重复次数，取最快一次')
+    parser.add_argument('--no-save', action='store_true', help='不写入结果文件')
+    parser.add_argument('--_processor', help=argparse.SUPPRESS)
+    parser.add_argument('--_target', help=argparse.SUPPRESS)
+    parser.add_argument('--_stages', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._processor:
+        run_processor_child(args._processor, args._target, args._stages)
+        return
+
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"未知测试集: {', '.join(sorted(unknown))}")
+
+    commit = git_commit()
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    records = []
+    for size_text in args.sizes.split(","):
+        lines = parse_size(size_text)
+        repeat = args.repeat if lines <= 100000 else 1
+        print(f"\n== {lines} 行 ==")
+        for suite in suites:
+            print(f"  运行 {suite} ...")
+            if suite == "stages":
+                results = bench_stages(lines, repeat)
+            elif suite == "processors":
+                results = bench_processors(lines)
+            else:
+                results = bench_m3u(lines, repeat)
+            for result in results:
+                result.update({"suite": suite, "size": lines, "commit": commit, "time": stamp,
+                               "python": platform.python_version()})
+                records.append(result)
+
+    regressions, failures = report(records, load_results())
+    if not args.no_save and records:
+        with open(RESULTS_FILE, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"\n结果已追加到 {os.path.relpath(RESULTS_FILE, ROOT_DIR)}")
+    if regressions:
+        print(f"{regressions} 项耗时明显增加")
+    if failures:
+        print(f"{failures} 个处理器运行失败，其计时不代表完整流程")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+本地替身 HTTP 服务器
+
+在后台线程中以 127.0.0.1 的随机端口提供一个目录下的文件，
+代替基准测试中各脚本写死的上游地址。StaticRedirectAdapter 挂到共享会话上后，
+任意上游 URL 都会被改写为该服务器上的同一个语料文件。
+"""
+import functools
+import threading
+from contextlib import contextmanager
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from requests.adapters import HTTPAdapter
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve(directory: str):
+    """在后台提供 directory 下的文件，产出基础 URL（如 http://127.0.0.1:12345）"""
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class StaticRedirectAdapter(HTTPAdapter):
+    """把所有请求改写为 target（本地服务器上的语料文件）后再发送"""
+
+    def __init__(self, target: str, **kwargs):
+        super().__init__(**kwargs)
+        self.target = target
+
+    def send(self, request, **kwargs):
+        request.url = self.target
+        return super().send(request, **kwargs)